@@ -1,204 +1,69 @@
 # -*- coding: utf-8 -*-
-# Flappy Bird Game - OOP Refactored - Final Touches (NameError check_collision FIX)
-
-import pygame
-import random
-import os
-import sys
-import time
-import math # For bird rotation
-
-# Attempt to import vlc, handle failure gracefully
-try:
-    import vlc
-    VLC_AVAILABLE = True
-except ImportError:
-    print("--------------------------------------------------------------------")
-    print("WARNING: python-vlc library not found. Background Music will be disabled.")
-    print("         Install it using command: pip install python-vlc")
-    # ... (rest of VLC warning messages)
-    VLC_AVAILABLE = False; vlc = None
-except Exception as import_err:
-    print(f"--------------------------------------------------------------------")
-    print(f"WARNING: Error importing vlc library: {import_err}\n         Background Music will be disabled.")
-    # ... (rest of VLC warning messages)
-    VLC_AVAILABLE = False; vlc = None
-
-# --- Initialization ---
-try:
-    pygame.init()
-    try: pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512); PYGAME_MIXER_OK = True; print("Pygame mixer initialized.")
-    except pygame.error as mixer_err: print(f"Warning: Pygame mixer init failed: {mixer_err}. SFX disabled."); PYGAME_MIXER_OK = False
-except pygame.error as pg_err: print(f"Fatal: Pygame init failed: {pg_err}"); sys.exit()
-
-# --- Constants ---
-WIDTH, HEIGHT = 400, 600
-GRAVITY = 0.5
-FLAP_STRENGTH = -9
-PIPE_GAP_BASE = 160
-PIPE_GAP_MIN = 100
-PIPE_GAP_REDUCTION_FACTOR = 0.5
-BASE_PIPE_SPEED = 3
-PIPE_SPEED_INCREASE_FACTOR = 0.1
-SCORE_INCREMENT = 1
-TARGET_FPS = 60
-BIRD_TOP_CLAMP_FACTOR = 0.5
-BIRD_MAX_ROTATION = 25
-BIRD_ROTATION_VELOCITY = 3
-MARIO_TRIGGER_SCORE = 9000 # Lower for testing
-MARIO_FALL_SPEED = 5
-CREDITS_SCROLL_SPEED = 1
-ANIMATION_SPEED_MS = 100
-HIGH_SCORE_FILE = "highscore.txt"
-GROUND_HEIGHT = 100
-FLASH_DURATION = 150
-RESTART_DELAY = 500
-
-# Bird Size
-BIRD_WIDTH, BIRD_HEIGHT = 40, 30
-# Mario Size
-MARIO_WIDTH, MARIO_HEIGHT = 40, 50
-
-# Colors
-WHITE = (255, 255, 255); BLACK = (0, 0, 0); GREEN = (0, 255, 0)
-BLUE = (135, 206, 250); DARK_GRAY = (50, 50, 50); RED = (255, 0, 0)
-SEMI_TRANSPARENT_BLACK = (0, 0, 0, 180)
-
-# Game States
-START_SCREEN = "START"; PLAYING = "PLAYING"; PAUSED = "PAUSED"
-GAME_OVER = "GAME_OVER"; MARIO_EVENT = "MARIO_EVENT"; CREDITS = "CREDITS"
-
-# --- Global Variables ---
-vlc_instance = None; flap_sound = None; collision_sound = None; point_sound = None
-bg_music_player = None; bg_music_file_path = None
-SOUND_ENABLED = False; MUSIC_ENABLED = False
-high_score = 0
-credits_scroll_pos = HEIGHT
-credits_lines = ["Flappy Bird Clone", "", "Enhanced Version", "", "Game By: You & AI", "", "Assets & Libraries:", "Pygame, python-vlc", "(Ensure assets are in Downloads)", "", "Press ESC to Quit"]
-
-
-# --- Asset Finding Helper ---
-def find_asset_path(filename_base, extensions):
-    downloads_folder = None
-    try: downloads_folder = os.path.join(os.path.expanduser("~"), "Downloads")
-    except Exception: return None
-    if not os.path.isdir(downloads_folder): return None
-    for ext in extensions:
-        path = os.path.join(downloads_folder, f"{filename_base}{ext}")
-        if os.path.exists(path): return path
-    return None
-
-# --- High Score Handling ---
-def load_high_score():
-    try:
-        if os.path.exists(HIGH_SCORE_FILE):
-            with open(HIGH_SCORE_FILE, 'r') as f: return int(f.read().strip())
-    except Exception: pass
-    return 0
-
-def save_high_score(new_high_score):
-    # Define filepath function locally or move it globally if needed elsewhere
-    def get_highscore_filepath():
-        try:
-            if getattr(sys, 'frozen', False): exe_dir = os.path.dirname(sys.executable); return os.path.join(exe_dir, HIGH_SCORE_FILE)
-            else: script_dir = os.path.dirname(os.path.abspath(__file__)); return os.path.join(script_dir, HIGH_SCORE_FILE)
-        except Exception: return HIGH_SCORE_FILE
-    filepath = get_highscore_filepath()
-    try:
-        with open(filepath, 'w') as f: f.write(str(new_high_score))
-        print(f"New high score saved: {new_high_score} to {filepath}")
-    except Exception as e: print(f"Warning: Could not save high score to {filepath}: {e}")
-
-# --- Audio Helper Functions (Defined globally for callbacks/simplicity) ---
-def play_sound(sound_obj):
-    global SOUND_ENABLED
-    if SOUND_ENABLED and sound_obj:
-        try: sound_obj.play()
-        except Exception as e: print(f"SFX Play Error: {e}"); SOUND_ENABLED = False
-
-def play_music():
-    global MUSIC_ENABLED, vlc_instance, bg_music_player, bg_music_file_path
-    if MUSIC_ENABLED and bg_music_player and vlc_instance and bg_music_file_path:
-        try:
-            state = bg_music_player.get_state()
-            if state not in [vlc.State.Playing, vlc.State.Paused]:
-                 media = vlc_instance.media_new(bg_music_file_path)
-                 if media: bg_music_player.set_media(media); media.release(); bg_music_player.play()
-                 else: MUSIC_ENABLED = False
-        except Exception as e: print(f"Music Play Error: {e}"); MUSIC_ENABLED = False
-
-def pause_music():
-    if MUSIC_ENABLED and bg_music_player and bg_music_player.is_playing():
-        try: bg_music_player.pause()
-        except Exception: pass
-
-def resume_music():
-     global MUSIC_ENABLED
-     if MUSIC_ENABLED and bg_music_player:
-        try:
-            if bg_music_player.get_state() == vlc.State.Paused: bg_music_player.pause() # Toggles
-            elif bg_music_player.get_state() != vlc.State.Playing: play_music() # Restart
-        except Exception: MUSIC_ENABLED = False
-
-# --- Collision Check Functions (Defined globally) --- ## <<<< FIX: DEFINED HERE
-def check_collision(b_rect, p_rect_list, pipe_w): # Pass pipe_w for efficiency
-    """Collision: pipes or ground ONLY."""
-    if not b_rect: return False
-    if b_rect.bottom >= HEIGHT - GROUND_HEIGHT: return True # Use Ground Constant
-    for pipe_rect in p_rect_list: # p_list now contains actual Rect objects
-        # Optimization: Broad phase check (optional but can help)
-        if pipe_rect.right > b_rect.left and pipe_rect.left < b_rect.right:
-             if b_rect.colliderect(pipe_rect): return True # Pipe collision
-    return False
-
-def check_mario_collision(b_rect, m_rect):
-    if m_rect and b_rect and b_rect.colliderect(m_rect): return True
-    return False
-
-# --- Bird Class ---
-class Bird:
-    def __init__(self, x, y, animation_images):
-        self.start_x, self.start_y = x, y
-        self.images = animation_images if animation_images else [pygame.Surface((BIRD_WIDTH, BIRD_HEIGHT), pygame.SRCALPHA)]
-        if not animation_images: self.images[0].fill(GREEN)
-        self.image = self.images[0]
-        self.rect = self.image.get_rect(center=(x + BIRD_WIDTH / 2, y + BIRD_HEIGHT / 2))
-        self.velocity = 0.0
-        self.rotation = 0.0
-        self.frame_index = 0
-# -*- coding: utf-8 -*-
 # Flappy Bird Game - OOP Refactored - Final (PyInstaller Downloads Fix)
 
+import time
+STARTUP_T0 = time.perf_counter() # Start of the startup phase report (includes importing pygame)
+import sys
+# pygame imports surfarray, and with it NumPy (~100 ms), whenever NumPy is installed. Hide NumPy while pygame loads;
+# need_numpy() imports both on first use. Skipped when the host program already has NumPy loaded.
+_DEFER_NUMPY = 'numpy' not in sys.modules
+if _DEFER_NUMPY: sys.modules['numpy'] = None
 import pygame
+if _DEFER_NUMPY: del sys.modules['numpy']
 import random
 import os
-import sys
-import time
+import threading # Background audio loading
 import math # For bird rotation
-
-# Attempt to import vlc, handle failure gracefully
+import struct # Replay file header
+import json # Asset bundle index
+import mmap # Asset bundle loading
+import queue # Capture frames -> encoder thread
+import shutil, subprocess # ffmpeg for video capture
+import zlib # Tournament course rule checksums
+from array import array # Packed tournament courses
+from collections import OrderedDict, deque # LRU text cache, env frame stacks
+
+# NumPy is optional: only BatchSimulation, FlappyEnv and the ghost race need it. It is imported on first use
+# (need_numpy), as is Pillow for GIF capture (need_pillow) - together they would add ~150 ms before the first frame.
+np = None
+Image = None
+
+# SQLite is optional too (some embedded Pythons ship without it): run statistics are skipped without it
 try:
-    import vlc
-    VLC_AVAILABLE = True
+    import sqlite3
 except ImportError:
-    print("--------------------------------------------------------------------")
-    print("WARNING: python-vlc library not found. Background Music will be disabled.")
-    print("         Install it using command: pip install python-vlc")
-    print("         You also need the VLC media player application installed.")
-    print("--------------------------------------------------------------------")
-    VLC_AVAILABLE = False; vlc = None
-except Exception as import_err:
-    print(f"--------------------------------------------------------------------")
-    print(f"WARNING: Error importing vlc library: {import_err}\n         Background Music will be disabled.")
-    print(f"--------------------------------------------------------------------")
-    VLC_AVAILABLE = False; vlc = None
+    sqlite3 = None
+
+def need_numpy(what):
+    """ Import NumPy into the module global np; ImportError naming what needed it if it is missing. """
+    global np
+    if np is None:
+        try: import numpy
+        except ImportError: raise ImportError(f"{what} needs numpy (pip install numpy)") from None
+        np = numpy
+        if "pygame.surfarray" not in sys.modules: __import__("pygame.surfarray") # Skipped at startup (see _DEFER_NUMPY)
+    return np
+
+def need_pillow(what):
+    """ Import Pillow's Image into the module global Image, like need_numpy. """
+    global Image
+    if Image is None:
+        try: from PIL import Image as pil_image
+        except ImportError: raise ImportError(f"{what} needs Pillow (pip install pillow)") from None
+        Image = pil_image
+    return Image
 
 # --- Initialization ---
-try:
-    pygame.init()
-    try: pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512); PYGAME_MIXER_OK = True; print("Pygame mixer initialized.")
-    except pygame.error as mixer_err: print(f"Warning: Pygame mixer init failed: {mixer_err}. SFX disabled."); PYGAME_MIXER_OK = False
-except pygame.error as pg_err: print(f"Fatal: Pygame init failed: {pg_err}"); sys.exit()
+# Nothing starts at import: Game brings up display + fonts, the mixer starts with the audio (init_mixer)
+PYGAME_MIXER_OK = None # None = not tried yet
+
+def init_mixer():
+    """ Start the pygame mixer once. Returns PYGAME_MIXER_OK. """
+    global PYGAME_MIXER_OK
+    if PYGAME_MIXER_OK is None:
+        try: pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512); PYGAME_MIXER_OK = True; print("Pygame mixer initialized.")
+        except pygame.error as mixer_err: print(f"Warning: Pygame mixer init failed: {mixer_err}. SFX disabled."); PYGAME_MIXER_OK = False
+    return PYGAME_MIXER_OK
 
 # --- Constants ---
 WIDTH, HEIGHT = 400, 600
@@ -211,17 +76,91 @@ BASE_PIPE_SPEED = 3
 PIPE_SPEED_INCREASE_FACTOR = 0.1
 SCORE_INCREMENT = 1
 TARGET_FPS = 60
+FRAME_MS = 1000.0 / TARGET_FPS # Sim time covered by one update()
+SIM_DT = 1.0 / TARGET_FPS # Fixed timestep (seconds) for Game.run's accumulator
+MAX_SIM_STEPS_PER_FRAME = 5 # Catch-up cap per rendered frame; beyond this the game slows instead of spiralling
+MAX_FRAME_TIME = 0.25 # Longest real frame fed to the accumulator (window drags, debugger stops)
 BIRD_TOP_CLAMP_FACTOR = 0.5
 BIRD_MAX_ROTATION = 25
 BIRD_ROTATION_VELOCITY = 3
+BIRD_ROTATION_CACHE_STEP = 1.5 # Degrees between pre-rotated bird sprites; Bird.update's angles are -90 or 25 plus multiples of it
+BIRD_ROTATION_CACHE_MAX_BYTES = 8 * 1024 * 1024 # Rotation atlas budget (worst-case estimate; both 1.5 deg grids use ~3.4 MB); the step is coarsened to fit (None = no limit)
 MARIO_TRIGGER_SCORE = 9000 # Lower for testing
 MARIO_FALL_SPEED = 5
 CREDITS_SCROLL_SPEED = 1
 ANIMATION_SPEED_MS = 100
 HIGH_SCORE_FILE = "highscore.txt" # Filename for high score
+HIGH_SCORE_HISTORY = 10 # Earlier high scores ("score unix_time" lines) kept under the best one
+RUN_STATS_FILE = "runs.sqlite3" # Per-run records (SQLite) behind the leaderboards
+RUN_STATS_BATCH = 16 # Finished runs queued before one batched insert
+RUN_STATS_FLUSH_S = 30.0 # ...or after this long, whichever comes first (and always on shutdown)
+LEADERBOARD_SIZE = 5 # Top runs shown on the start and game-over screens
 GROUND_HEIGHT = 100
 FLASH_DURATION = 150
 RESTART_DELAY = 500
+SWEPT_COLLISION = True # Continuous pipe collision (catches between-frame corner clips); False = legacy per-frame overlap
+REPLAY_RECORDING = True # Save every finished run (seed + flap frames) to REPLAY_FILE
+REPLAY_FILE = "last_replay.flr"
+REPLAY_SNAPSHOT_INTERVAL = 600 # Frames between sim snapshots kept for replay seeking
+REPLAY_SEEK_FRAMES = 5 * TARGET_FPS # LEFT / RIGHT jump during windowed playback
+PIXEL_COLLISION = False # Add a pygame.mask narrow phase after the swept box test (sprites with transparent edges)
+DIRTY_RECT_RENDERING = False # Push only changed regions with display.update(rects) instead of flip()
+DIRTY_FULL_FRAME_FRACTION = 0.6 # Above this share of the screen, one full update is cheaper than many rects
+HUD_HEIGHT = 50 # Band at the top holding the Score / Hi text
+TEXT_CACHE_SIZE = 128 # Rendered text surfaces kept by UIManager (least recently used are evicted)
+PROFILER_FRAMES = 600 # Frames kept in the frame profiler's ring buffer (10 s at TARGET_FPS)
+PROFILER_HUD_REFRESH = 30 # Frames between perf HUD refreshes (F3 toggles the HUD)
+PROFILER_EXPORT_FILE = None # .csv or .json path the profiler ring is written to on exit (or --profile FILE)
+INPUT_POLL_MS = 1.0 # Event polling interval while waiting for the next frame, so presses are stamped this precisely (0 = clock.tick)
+INPUT_LATENCY_SAMPLES = 240 # Flaps kept for the press -> present latency stats (F3 HUD, profile export, exit report)
+QUALITY_GOVERNOR = True # Step through QUALITY_TIERS to hold TARGET_FPS on slow machines; False = stay on the first (or --quality NAME)
+QUALITY_WINDOW_FRAMES = 60 # Rolling window of per-frame work times (update + draw + present) the governor judges
+QUALITY_DOWNGRADE_FRACTION = 0.85 # Drop a tier when the window's p90 is above this share of the frame budget...
+QUALITY_UPGRADE_FRACTION = 0.5 # ...and raise one only after it has stayed below this share
+QUALITY_UPGRADE_FRAMES = 5 * TARGET_FPS # ...for this many frames in a row (doubled each time a raise has to be undone)
+FLASH_REDUCED_BORDER = 12 # Width of the white frame the reduced death flash draws instead of a full-screen blend
+DROPPED_FRAME_FACTOR = 1.5 # A frame taking longer than this many frame budgets counts as dropped
+AUTOPILOT_FILE = "autopilot.json" # Best genome from --train-autopilot (checkpointed whenever it improves)
+AUTOPILOT_HIDDEN = 8 # Hidden units in the autopilot MLP
+AUTOPILOT_POPULATION = 96 # Genomes per generation
+AUTOPILOT_ELITE = 12 # Best genomes kept unchanged and used as parents
+AUTOPILOT_MUTATION = 0.25 # Std-dev of the gaussian noise added to every child weight
+AUTOPILOT_SEEDS_PER_GEN = 4 # Courses per generation, shared by every genome so their scores compare fairly
+AUTOPILOT_VALIDATION_SEEDS = 8 # Fixed courses the elite are re-scored on before a checkpoint, so easy draws don't win it
+AUTOPILOT_MAX_FRAMES = 6000 # Episode cap while training (100 s of play)
+ATTRACT_DELAY_MS = 8000 # Idle time on START before the trained autopilot plays a demo run
+ATTRACT_RESTART_MS = 1500 # How long a demo's game over stays up before the title returns
+BENCH_SEED = 1234 # Seed for the --bench game and its scripted input
+BENCH_ROUNDS = 9 # Timed rounds per benchmark op (median, best and the spread between rounds are reported)
+BENCH_MIN_ROUND_S = 0.1 # Calls per round double until a round lasts at least this long
+BENCH_TOLERANCE = 0.20 # --bench-baseline flags an op whose median is at least this much slower than the baseline's...
+BENCH_SPREAD_FACTOR = 2.0 # ...or this many times the wider of the two runs' round-to-round spreads, if that is more (noisy ops),
+                          # after dividing out the machine's speed (the median slowdown over all ops) since the baseline
+BENCH_NOISE_FLOOR_US = 1.0 # ...and by more than this in absolute terms (timer and scheduler jitter on sub-us ops);
+                           # a flagged op is timed again and only fails if the re-run is over the threshold too
+BENCH_OUTPUT_FILE = "bench_output.txt" # JSON results of the last --bench run
+ASSET_BUNDLE_FILE = "assets.flpb" # Packed sprites + SFX (build with --build-bundle); falls back to loose files
+BACKGROUND_AUDIO_LOADING = True # Start the mixer and load sounds on a worker thread after the first frame; False = before it
+SFX_VOICES = {"flap": 2, "point": 2, "collision": 1} # Mixer channels reserved per sound; their sum caps concurrent SFX
+GHOST_COUNT = 500 # Best recorded runs (with replays) flown as ghosts; needs numpy and REPLAY_RECORDING
+GHOSTS_ON_START = True # Ghost race on the START screen, looping
+GHOSTS_IN_PLAY = False # Also fly the ghosts alongside the player's own runs
+GHOST_ALPHA = 90 # Ghost sprite opacity (0-255)
+GHOST_TINTS = [(255, 255, 255), (255, 140, 140), (140, 200, 255), (255, 230, 110)] # Cycled by rank, best run first
+GHOST_ROTATION_STEP = 7.5 # Degrees between pre-rotated ghost sprites (coarser than the player's)
+GHOST_RESTART_FRAMES = TARGET_FPS # Pause on START after the last ghost lands before the race restarts
+CAPTURE_QUEUE_FRAMES = 120 # Grabbed frames buffered for the encoder thread; live capture drops frames rather than wait
+CAPTURE_GIF_FPS = 30 # GIF capture keeps every (TARGET_FPS / this)th frame (GIF delays are in 10 ms steps)
+CAPTURE_GIF_SCALE = 0.5 # GIF frames are downscaled by this factor
+CAPTURE_TAIL_FRAMES = TARGET_FPS # Frames of the end screen kept after a rendered replay finishes
+COURSE_PIPES = 2000 # Pipes precomputed per tournament course; a run that outlasts them starts the course over
+COURSE_CACHE_DIR = "courses" # Generated tournament courses, one <seed>.flc each, next to the exe/script
+ENV_FRAME_SKIP = 1 # FlappyEnv: sim frames per step() (the action's flap lands on the first)
+ENV_FRAME_STACK = 1 # FlappyEnv: most recent observations stacked into each returned one
+ENV_PIXEL_SIZE = (84, 84) # FlappyEnv pixel observations: (height, width) after downscaling
+ENV_NEXT_PIPES = 2 # FlappyEnv state vectors: upcoming pipe gaps included
+ENV_MAX_FRAMES = 20000 # FlappyEnv: episodes are truncated after this many sim frames
+ENV_REWARD_ALIVE = 0.1; ENV_REWARD_POINT = 1.0; ENV_REWARD_DEATH = -1.0 # FlappyEnv rewards per frame survived / pipe passed / crash
 
 # Bird Size
 BIRD_WIDTH, BIRD_HEIGHT = 40, 30
@@ -233,23 +172,45 @@ WHITE = (255, 255, 255); BLACK = (0, 0, 0); GREEN = (0, 255, 0)
 BLUE = (135, 206, 250); DARK_GRAY = (50, 50, 50); RED = (255, 0, 0)
 SEMI_TRANSPARENT_BLACK = (0, 0, 0, 180)
 
+# Parallax layers, back to front: (image name, speed as a fraction of the pipe speed, minimum px/frame, top y, fallback colour).
+# Images beyond background/ground load from <name>.png; a missing one uses its fallback colour, or is skipped when that is None.
+# e.g. ("hills", 0.6, 0.0, 320, None) adds a depth layer between the sky and the ground.
+PARALLAX_LAYERS = [
+    ("background", 0.3, 1.0, 0, BLUE),
+    ("ground", 1.0, 0.0, HEIGHT - GROUND_HEIGHT, GREEN),
+]
+
+# Quality tiers picked by the frame-pacing governor, best first: (name, ghosts drawn (None = all), depth layers drawn
+# (PARALLAX_LAYERS between the first and the last), background scrolls, pause tint drawn, death flash "full" / "reduced" / "off").
+# Each step down drops something START or PLAYING draws; the ground always scrolls since it moves with the pipes,
+# and a held background mostly pays off with DIRTY_RECT_RENDERING (it stops dirtying the whole screen).
+QUALITY_TIERS = [
+    ("high", None, True, True, True, "full"),
+    ("medium", 100, False, True, True, "reduced"),
+    ("low", 25, False, False, False, "reduced"),
+    ("minimal", 0, False, False, False, "off"),
+]
+
 # Game States
 START_SCREEN = "START"; PLAYING = "PLAYING"; PAUSED = "PAUSED"
 GAME_OVER = "GAME_OVER"; MARIO_EVENT = "MARIO_EVENT"; CREDITS = "CREDITS"
 
 # --- Global Variables ---
-# Audio
-vlc_instance = None; flap_sound = None; collision_sound = None; point_sound = None
-bg_music_player = None; bg_music_file_path = None
-SOUND_ENABLED = False; MUSIC_ENABLED = False
 # Score
 high_score = 0
 # Credits
 credits_scroll_pos = HEIGHT
-credits_lines = ["Flappy Bird Clone", "", "Enhanced Version", "", "Game By: You & AI", "", "Assets & Libraries:", "Pygame, python-vlc", "(Ensure assets are in Downloads)", "", "Press ESC to Quit"]
+credits_lines = ["Flappy Bird Clone", "", "Enhanced Version", "", "Game By: You & AI", "", "Assets & Libraries:", "Pygame", "(Ensure assets are in Downloads)", "", "Press ESC to Quit"]
+
+_TICKS_START = time.perf_counter()
 
 
 # --- Helper Functions (PyInstaller Aware - Downloads for Dev) --- ## <<<< UPDATED SECTION
+def ticks_ms():
+    """ Milliseconds since start-up, for the game's UI timers. Stands in for pygame's get_ticks(), which
+        stays at 0 unless something happens to start SDL's timer (pygame.init() is no longer called). """
+    return int((time.perf_counter() - _TICKS_START) * 1000)
+
 def resource_path(relative_path):
     """ Get absolute path to resource.
         Looks in Downloads during development (running .py),
@@ -293,45 +254,358 @@ def find_asset_path(filename_base, extensions):
     return None
 
 # --- High Score Handling (PyInstaller Aware - Saves next to EXE/Script) --- ## <<<< UPDATED SECTION
-def get_highscore_filepath():
-    """ Determines the path for the highscore file (next to exe or script). """
+def get_data_filepath(filename):
+    """ Path for a writable data file (high score, replays) next to the exe or script. """
     try:
         if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'): # Running as bundled app
              exe_dir = os.path.dirname(sys.executable)
-             return os.path.join(exe_dir, HIGH_SCORE_FILE)
+             return os.path.join(exe_dir, filename)
         else: # Running as script
             script_dir = os.path.dirname(os.path.abspath(__file__))
-            return os.path.join(script_dir, HIGH_SCORE_FILE)
+            return os.path.join(script_dir, filename)
     except Exception:
-        print("Warning: Could not determine optimal high score path. Using current directory.")
-        return HIGH_SCORE_FILE # Fallback
+        print(f"Warning: Could not determine optimal path for {filename}. Using current directory.")
+        return filename # Fallback
+
+def get_highscore_filepath():
+    """ Determines the path for the highscore file (next to exe or script). """
+    return get_data_filepath(HIGH_SCORE_FILE)
 
 def load_high_score():
     filepath = get_highscore_filepath()
     try:
         if os.path.exists(filepath):
-            with open(filepath, 'r') as f: return int(f.read().strip())
+            with open(filepath, 'r') as f: return int(f.readline().strip()) # Best score is the first line
     except Exception as e:
         print(f"Warning: Could not read or parse high score from '{filepath}': {e}")
     return 0
 
-def save_high_score(new_high_score):
-    filepath = get_highscore_filepath()
+def load_high_score_history():
+    """ Earlier high scores as [(score, unix_time), ...], newest first. """
+    filepath = get_highscore_filepath(); history = []
+    try:
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as f: lines = f.read().splitlines()[1:]
+            for line in lines:
+                parts = line.split()
+                if len(parts) == 2: history.append((int(parts[0]), float(parts[1])))
+    except Exception as e: print(f"Warning: Could not read high score history from '{filepath}': {e}")
+    return history[:HIGH_SCORE_HISTORY]
+
+def save_high_score(new_high_score, history=()):
+    """ Atomic save: write a temp file beside the real one, fsync, then os.replace it over the
+        original, so a crash mid-write leaves the old file or the new one - never a truncated one. """
+    filepath = get_highscore_filepath(); tmp_path = filepath + ".tmp"
     try:
-        with open(filepath, 'w') as f: f.write(str(new_high_score))
+        with open(tmp_path, 'w') as f:
+            f.write(f"{new_high_score}\n" + "".join(f"{score} {stamp:.0f}\n" for score, stamp in history))
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
         print(f"New high score saved: {new_high_score} to {filepath}")
-    except Exception as e: print(f"Warning: Could not save high score to {filepath}: {e}")
+        return True
+    except Exception as e: print(f"Warning: Could not save high score to {filepath}: {e}"); return False
 
-# --- Set up Display (Moved after helpers, before Game class needs it) ---
-screen = None
-try:
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("Flappy Bird OOP - Final")
-    print("Display mode set successfully.")
-except pygame.error as display_err: print(f"Fatal Error: Could not set display mode: {display_err}"); pygame.quit(); sys.exit()
+class HighScoreWriter:
+    """ Saves high scores and the last run's replay on a background thread so the death frame never touches the disk.
+        Scores submitted while a write is in flight coalesce into one follow-up write; a newer replay replaces a queued one. """
+    def __init__(self):
+        self.history = load_high_score_history()
+        self.pending = None; self.pending_replay = None; self.writing = False; self.closed = False; self.writes = 0
+        self.cond = threading.Condition(); self.thread = None
+
+    def submit(self, score):
+        with self.cond:
+            self.history = ([(score, time.time())] + self.history)[:HIGH_SCORE_HISTORY]
+            self.pending = score if self.pending is None else max(self.pending, score)
+            self._start(); self.cond.notify_all()
+
+    def submit_replay(self, path, data, flaps=0):
+        """ Queue replay bytes for an atomic write to path. """
+        with self.cond: self.pending_replay = (path, data, flaps); self._start(); self.cond.notify_all()
+
+    def _start(self):
+        if self.thread is None: # Started on the first write, not at startup
+            self.thread = threading.Thread(target=self._run, name="highscore-writer", daemon=True); self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.pending is None and self.pending_replay is None and not self.closed: self.cond.wait()
+                if self.pending is None and self.pending_replay is None: return # Closed with nothing left to write
+                score, history, replay = self.pending, list(self.history), self.pending_replay
+                self.pending = None; self.pending_replay = None; self.writing = True
+            if score is not None: save_high_score(score, history)
+            if replay is not None:
+                path, data, flaps = replay
+                try: Replay.write(path, data); print(f"Replay saved: {path} ({flaps} flaps)")
+                except Exception as e: print(f"Warning: Could not save replay to {path}: {e}")
+            with self.cond: self.writing = False; self.writes += 1; self.cond.notify_all()
+
+    def flush(self, timeout=2.0):
+        """ Block until every submitted score and replay is on disk (or timeout). """
+        with self.cond: return self.cond.wait_for(lambda: self.pending is None and self.pending_replay is None and not self.writing, timeout)
+
+    def close(self, timeout=2.0):
+        """ Write anything pending, then stop the thread. """
+        with self.cond: self.closed = True; self.cond.notify_all()
+        if self.thread: self.thread.join(timeout)
+
+# --- Run Statistics (SQLite) ---
+class RunStatsStore:
+    """ One row per finished run in SQLite, in WAL mode so screen queries never wait on the writer.
+        Runs queue in memory and a writer thread inserts them in batches on its own connection;
+        top() merges the queue in, so the screens are current before the batch lands. """
+    COLUMNS = ("ended_at", "score", "duration", "frames", "seed", "cause", "max_speed", "frame_ms_avg", "frame_ms_p99", "frame_ms_max", "replay")
+    SCHEMA = """CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, ended_at REAL NOT NULL, score INTEGER NOT NULL,
+                    duration REAL, frames INTEGER, seed INTEGER, cause TEXT, max_speed REAL,
+                    frame_ms_avg REAL, frame_ms_p99 REAL, frame_ms_max REAL, replay BLOB);
+                CREATE INDEX IF NOT EXISTS runs_by_score ON runs (score DESC, ended_at);"""
+    def __init__(self, path=None):
+        self.path = path or get_data_filepath(RUN_STATS_FILE)
+        self.pending = []; self.closed = False; self.cond = threading.Condition(); self.thread = None
+        self.db = None
+        if sqlite3 is None: print("Warning: sqlite3 unavailable. Run statistics disabled."); return
+        try:
+            self.db = self._connect(); self.db.executescript(self.SCHEMA)
+            if "replay" not in [row[1] for row in self.db.execute("PRAGMA table_info(runs)")]: # Stores from before ghosts
+                with self.db: self.db.execute("ALTER TABLE runs ADD COLUMN replay BLOB")
+        except sqlite3.Error as e: print(f"Warning: Run statistics disabled ({self.path}): {e}"); self.db = None
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=2.0)
+        db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=NORMAL") # WAL + NORMAL: durable enough, no fsync per commit
+        return db
+
+    def record(self, **run):
+        """ Queue a finished run: COLUMNS as keywords (replay = Replay.to_bytes()), plus frame_ms (list of frame times) for the timing stats. """
+        if self.db is None: return
+        with self.cond:
+            self.pending.append(run)
+            if self.thread is None: self.thread = threading.Thread(target=self._run, name="run-stats-writer", daemon=True); self.thread.start()
+            if len(self.pending) >= RUN_STATS_BATCH: self.cond.notify_all()
+
+    def _row(self, run):
+        frame_ms = sorted(run.get("frame_ms") or ())
+        if frame_ms: run = dict(run, frame_ms_avg=sum(frame_ms) / len(frame_ms), frame_ms_p99=frame_ms[min(len(frame_ms) - 1, int(len(frame_ms) * 0.99))], frame_ms_max=frame_ms[-1])
+        return tuple(run.get(c) for c in self.COLUMNS)
+
+    def _run(self):
+        try: db = self._connect()
+        except sqlite3.Error as e: print(f"Warning: Run statistics writer failed: {e}"); return
+        insert = f"INSERT INTO runs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})"
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.closed or len(self.pending) >= RUN_STATS_BATCH, RUN_STATS_FLUSH_S)
+                batch = list(self.pending)
+                if not batch and self.closed: break
+            if batch:
+                try:
+                    with db: db.executemany(insert, [self._row(r) for r in batch]) # One transaction per batch
+                except sqlite3.Error as e: print(f"Warning: Could not save {len(batch)} run(s): {e}")
+                with self.cond: del self.pending[:len(batch)]
+        db.close()
+
+    def top(self, n=LEADERBOARD_SIZE):
+        """ Best n runs as (score, ended_at, seed, cause, duration), queued runs included. Reads the
+            score index in order and stops after n rows, so the cost doesn't grow with the table. """
+        if self.db is None: return []
+        with self.cond: queued = [(r["score"], r["ended_at"], r.get("seed"), r.get("cause"), r.get("duration")) for r in self.pending]
+        try: rows = self.db.execute("SELECT score, ended_at, seed, cause, duration FROM runs ORDER BY score DESC, ended_at LIMIT ?", (n,)).fetchall()
+        except sqlite3.Error as e: print(f"Warning: Could not read run statistics: {e}"); rows = []
+        merged = {(r[1], r[2]): r for r in rows + queued} # A batch that just landed is in both lists
+        return sorted(merged.values(), key=lambda r: (-r[0], r[1]))[:n]
+
+    def ghosts(self, n=GHOST_COUNT):
+        """ Best n runs that kept a replay, as (score, ended_at, seed, replay bytes), queued runs included. """
+        if self.db is None: return []
+        with self.cond: queued = [(r["score"], r["ended_at"], r.get("seed"), r["replay"]) for r in self.pending if r.get("replay")]
+        try: rows = self.db.execute("SELECT score, ended_at, seed, replay FROM runs WHERE replay IS NOT NULL ORDER BY score DESC, ended_at LIMIT ?", (n,)).fetchall()
+        except sqlite3.Error as e: print(f"Warning: Could not read run replays: {e}"); rows = []
+        merged = {(r[1], r[2]): r for r in rows + queued}
+        return sorted(merged.values(), key=lambda r: (-r[0], r[1]))[:n]
+
+    def close(self, timeout=2.0):
+        """ Insert whatever is queued, then stop the writer and close the connection. """
+        with self.cond: self.closed = True; self.cond.notify_all()
+        if self.thread: self.thread.join(timeout)
+        if self.db is not None: self.db.close(); self.db = None
+
+# --- Asset Bundle ---
+# Layout: header, JSON index, RGBA atlas pixels, then raw SFX PCM (mixer format recorded in the index).
+BUNDLE_MAGIC = b"FLPB"; BUNDLE_VERSION = 1
+BUNDLE_HEADER = struct.Struct("<4sBI") # magic, version, index length
+BUNDLE_SPRITES = {"bird_down": (BIRD_WIDTH, BIRD_HEIGHT), "bird_mid": (BIRD_WIDTH, BIRD_HEIGHT), "bird_up": (BIRD_WIDTH, BIRD_HEIGHT),
+                  "pipe": None, "background": None, "ground": None, "mario": (MARIO_WIDTH, MARIO_HEIGHT)} # name -> pre-scale size
+BUNDLE_SOUNDS = ("flap", "collision", "point")
+BUNDLE_ATLAS_WIDTH = 1024
+
+def build_asset_bundle(out_path=None):
+    """ Pack the loose PNGs (pre-scaled) into one RGBA atlas and the WAVs (decoded) into a single bundle file. """
+    out_path = out_path or resource_path(ASSET_BUNDLE_FILE)
+    sprites = {}
+    for name, size in BUNDLE_SPRITES.items():
+        path = find_asset_path(name, [".png"])
+        if not path: print(f" - {name}.png missing, not bundled."); continue
+        img = pygame.image.load(path)
+        sprites[name] = pygame.transform.scale(img, size) if size else img
+    # Shelf packing, tallest first
+    atlas_w = max([BUNDLE_ATLAS_WIDTH] + [s.get_width() for s in sprites.values()])
+    x = y = shelf_h = 0; rects = {}
+    for name in sorted(sprites, key=lambda n: -sprites[n].get_height()):
+        w, h = sprites[name].get_size()
+        if x + w > atlas_w: x = 0; y += shelf_h; shelf_h = 0
+        rects[name] = (x, y, w, h); x += w; shelf_h = max(shelf_h, h)
+    atlas_h = max(1, y + shelf_h)
+    pixels = bytearray(atlas_w * atlas_h * 4)
+    for name, (x, y, w, h) in rects.items():
+        data = pygame.image.tobytes(sprites[name], "RGBA"); row_len = w * 4
+        for row in range(h):
+            start = ((y + row) * atlas_w + x) * 4
+            pixels[start:start + row_len] = data[row * row_len:(row + 1) * row_len]
+    sounds = {}
+    if init_mixer():
+        for name in BUNDLE_SOUNDS:
+            path = find_asset_path(name, [".wav"])
+            if path: sounds[name] = pygame.mixer.Sound(path).get_raw()
+            else: print(f" - {name}.wav missing, not bundled.")
+    else: print(" - Mixer unavailable, SFX not bundled.")
+    index = {"atlas": [atlas_w, atlas_h], "sprites": rects, "mixer": list(pygame.mixer.get_init() or []) if PYGAME_MIXER_OK else [], "sounds": {}}
+    offset = len(pixels)
+    for name, raw in sounds.items(): index["sounds"][name] = [offset, len(raw)]; offset += len(raw)
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    with open(out_path, 'wb') as f:
+        f.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(index_bytes))); f.write(index_bytes); f.write(pixels)
+        for raw in sounds.values(): f.write(raw)
+    print(f"Asset bundle written: {out_path} ({len(rects)} sprites, {len(sounds)} sounds, {offset + BUNDLE_HEADER.size + len(index_bytes)} bytes)")
+    return out_path
+
+def load_asset_bundle(path):
+    """ One-pass load of a bundle: mmap it, wrap the atlas pixels without decoding and cut the sprites out.
+        Returns (sprites, raw SFX PCM by name, the mixer format it was decoded for) or None to fall back. """
+    if not os.path.isfile(path): return None
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, index_len = BUNDLE_HEADER.unpack_from(mm)
+            if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION: print(f"Warning: {path} is not a v{BUNDLE_VERSION} asset bundle. Loading individual files."); return None
+            index = json.loads(mm[BUNDLE_HEADER.size:BUNDLE_HEADER.size + index_len].decode("utf-8"))
+            base = BUNDLE_HEADER.size + index_len
+            atlas_w, atlas_h = index["atlas"]
+            atlas = pygame.image.frombuffer(mm[base:base + atlas_w * atlas_h * 4], (atlas_w, atlas_h), "RGBA")
+            sprites = {}
+            for name, rect in index["sprites"].items():
+                sub = atlas.subsurface(rect)
+                sprites[name] = sub.convert() if name == "background" else sub.convert_alpha()
+            sounds = {name: mm[base + offset:base + offset + length] for name, (offset, length) in index["sounds"].items()}
+        return sprites, sounds, index["mixer"]
+    except Exception as e:
+        print(f"Warning: Could not load asset bundle {path}: {e}. Loading individual files.")
+        return None
+
+# --- Collision Check Functions (Defined globally) ---
+def check_collision(b_rect, p_rect_list, pipe_w): # Pass pipe_w for efficiency
+    """Collision: pipes or ground ONLY."""
+    if not b_rect: return False
+    if b_rect.bottom >= HEIGHT - GROUND_HEIGHT: return True # Use Ground Constant
+    for pipe_rect in p_rect_list: # p_list now contains actual Rect objects
+        # Optimization: Broad phase check (optional but can help)
+        if pipe_rect.right > b_rect.left and pipe_rect.left < b_rect.right:
+             if b_rect.colliderect(pipe_rect): return True # Pipe collision
+    return False
+
+def check_swept_collision(b_rect, prev_y, pipe_manager, bird_mask=None, pipe_mask=None, swept=True):
+    """ Continuous version of check_collision over the last step: the bird's box moves from prev_y to
+        b_rect.y while each pipe moves from prev_x to x, so fast pipes or large sim steps can't tunnel
+        through a corner. Any hit check_collision would report is reported here too.
+        With bird_mask/pipe_mask, box hits are confirmed pixel by pixel along the swept path.
+        swept=False (with prev_y == b_rect.y) checks only the current positions, like check_collision.
+    """
+    if not b_rect: return False
+    if b_rect.bottom >= HEIGHT - GROUND_HEIGHT: return True
+    bw, bh = b_rect.width, b_rect.height; pw = pipe_manager.pipe_width
+    dy = b_rect.y - prev_y
+    ring = pipe_manager.ring; cap = len(ring)
+    for i in range(pipe_manager.count):
+        p = ring[(pipe_manager.head + i) % cap]
+        # Bird x relative to the pipe: r0 at the start of the step, r1 at the end; boxes overlap while -bw < r < pw
+        r1 = b_rect.x - p.upper.x; r0 = b_rect.x - round(p.prev_x) if swept else r1
+        if r1 == r0:
+            if not -bw < r0 < pw: continue
+            t_lo, t_hi = 0.0, 1.0
+        else:
+            t_a = (-bw - r0) / (r1 - r0); t_b = (pw - r0) / (r1 - r0)
+            t_lo, t_hi = max(0.0, min(t_a, t_b)), min(1.0, max(t_a, t_b))
+            if t_lo >= t_hi: continue
+        # y is linear in t, so its extremes over [t_lo, t_hi] are at the ends
+        top_lo, top_hi = prev_y + dy * t_lo, prev_y + dy * t_hi
+        if min(top_lo, top_hi) >= p.upper.height and max(top_lo, top_hi) + bh <= p.lower.y: continue # Stayed in the gap
+        if bird_mask is None or pipe_mask is None: return True
+        # Narrow phase: step along the overlap at most 1px at a time
+        steps = max(1, math.ceil(max(abs(r1 - r0), abs(dy)) * (t_hi - t_lo)))
+        upper_y = p.upper.height - pipe_manager.pipe_height
+        for s in range(steps + 1):
+            t = t_lo + (t_hi - t_lo) * s / steps
+            bx = round(r0 + (r1 - r0) * t); by = round(prev_y + dy * t) # Bird offset from the pipe's left edge
+            if bird_mask.overlap(pipe_mask, (-bx, upper_y - by)) or bird_mask.overlap(pipe_mask, (-bx, p.lower.y - by)): return True
+    return False
+
+def check_mario_collision(b_rect, m_rect):
+    if m_rect and b_rect and b_rect.colliderect(m_rect): return True
+    return False
+
+# --- Display ---
+# The window is created by Game.__init__ only, so the module (and Simulation) can be imported headless.
+
+# --- Rotation Atlas ---
+class RotationAtlas:
+    """ Every animation frame pre-rotated at each quantized angle in [-90, BIRD_MAX_ROTATION],
+        with the offset from the sprite center to the rotated surface's top-left corner.
+        Built once at load time so drawing the bird is a lookup plus a blit.
+        Bird.update's angles come in two families: -90 + k * 1.5 (from rest or the dive clamp) and 25 - k * 1.5
+        (after the flap clamp), which don't share a grid. With both_ends a second grid anchored at MAX_ANGLE is
+        built too, so at whole sim steps and the default step every angle drawn is the exact rotation.
+    """
+    MIN_ANGLE = -90.0; MAX_ANGLE = float(BIRD_MAX_ROTATION)
+
+    def __init__(self, images, step=BIRD_ROTATION_CACHE_STEP, max_bytes=BIRD_ROTATION_CACHE_MAX_BYTES, both_ends=True):
+        grids = lambda s: 2 if both_ends and (self.MAX_ANGLE - self.MIN_ANGLE) % s else 1 # One grid when MAX_ANGLE is on the first
+        if max_bytes is not None:
+            # Rotated sprites are at most diagonal x diagonal; coarsen the step until the worst case fits
+            worst = sum((math.ceil(math.hypot(*img.get_size())) ** 2) * img.get_bytesize() for img in images)
+            while grids(step) * self._angle_count(step) * worst > max_bytes and step < (self.MAX_ANGLE - self.MIN_ANGLE): step *= 2
+        self.step = step
+        count = self._angle_count(step)
+        self.bytes_used = 0
+        self.frames = self._rotate_all(images, self.MIN_ANGLE, step, count)
+        self.frames_top = self._rotate_all(images, self.MAX_ANGLE, -step, count) if grids(step) == 2 else None # Anchored at MAX_ANGLE
+        print(f"Rotation atlas: {len(images)} frames x {count * grids(step)} angles (step {step:g} deg, {self.bytes_used // 1024} KB)")
+
+    def _rotate_all(self, images, start, step, count):
+        frames = []
+        for img in images:
+            entries = []
+            for i in range(count):
+                surf = pygame.transform.rotate(img, min(max(start + i * step, self.MIN_ANGLE), self.MAX_ANGLE))
+                w, h = surf.get_size()
+                entries.append((surf, (-(w // 2), -(h // 2))))
+                self.bytes_used += w * h * surf.get_bytesize()
+            frames.append(entries)
+        return frames
+
+    def _angle_count(self, step):
+        return math.ceil((self.MAX_ANGLE - self.MIN_ANGLE) / step) + 1
+
+    def lookup(self, frame_index, angle):
+        """ (surface, (offset_x, offset_y)) for the nearest cached angle. """
+        x = (angle - self.MIN_ANGLE) / self.step; i = round(x)
+        if self.frames_top is not None:
+            y = (self.MAX_ANGLE - angle) / self.step; j = round(y)
+            if abs(y - j) < abs(x - i): # Closer to the MAX_ANGLE-anchored grid
+                entries = self.frames_top[frame_index % len(self.frames_top)]
+                return entries[min(max(j, 0), len(entries) - 1)]
+        entries = self.frames[frame_index % len(self.frames)]
+        return entries[min(max(i, 0), len(entries) - 1)]
 
 # --- Bird Class ---
-# (Bird class remains the same)
 class Bird:
     def __init__(self, x, y, animation_images):
         self.start_x, self.start_y = x, y
@@ -340,179 +614,414 @@ class Bird:
         self.image = self.images[0]
         self.rect = self.image.get_rect(center=(x + BIRD_WIDTH / 2, y + BIRD_HEIGHT / 2))
         self.velocity = 0.0; self.rotation = 0.0; self.frame_index = 0
-        self.last_animation_time = pygame.time.get_ticks()
+        self.animation_ms = 0.0 # Sim time since last frame change (no wall clock, so it runs headless)
+        self.prev_y = self.rect.y; self.prev_rotation = self.rotation # Previous step, for render interpolation
+        self.rotation_atlas = None # Built by build_rotation_atlas() at load time (or lazily on first draw)
+    def build_rotation_atlas(self, step=BIRD_ROTATION_CACHE_STEP, max_bytes=BIRD_ROTATION_CACHE_MAX_BYTES):
+        self.rotation_atlas = RotationAtlas(self.images, step, max_bytes)
     def flap(self):
         self.velocity = float(FLAP_STRENGTH); self.rotation = float(BIRD_MAX_ROTATION + 5)
-    def update(self):
-        self.velocity += GRAVITY; self.rect.y += self.velocity
+    def update(self, dt=1.0):
+        """ dt: step length in frames (1.0 = one frame at TARGET_FPS). """
+        self.prev_y = self.rect.y; self.prev_rotation = self.rotation
+        self.velocity += GRAVITY * dt; self.rect.y += self.velocity * dt
         self.rect.top = max(self.rect.top, -BIRD_HEIGHT * BIRD_TOP_CLAMP_FACTOR)
         if len(self.images) > 1:
-            now = pygame.time.get_ticks()
-            if now - self.last_animation_time > ANIMATION_SPEED_MS:
+            self.animation_ms += FRAME_MS * dt
+            if self.animation_ms > ANIMATION_SPEED_MS:
                 self.frame_index = (self.frame_index + 1) % len(self.images)
-                self.last_animation_time = now
+                self.animation_ms = 0.0
             self.image = self.images[self.frame_index]
-        if self.velocity > 1: self.rotation -= BIRD_ROTATION_VELOCITY
-        else: self.rotation += BIRD_ROTATION_VELOCITY * 1.5
+        if self.velocity > 1: self.rotation -= BIRD_ROTATION_VELOCITY * dt
+        else: self.rotation += BIRD_ROTATION_VELOCITY * 1.5 * dt
         self.rotation = max(-90.0, min(self.rotation, float(BIRD_MAX_ROTATION)))
-    def get_rotated(self):
-        current_image = self.image if self.image else self.images[0]
-        rotated_image = pygame.transform.rotate(current_image, self.rotation)
-        new_rect = rotated_image.get_rect(center=self.rect.center)
-        return rotated_image, new_rect
-    def draw(self, surface):
-        rotated_image, rotated_rect = self.get_rotated()
-        surface.blit(rotated_image, (round(rotated_rect.x), round(rotated_rect.y)))
+    def _rotated_sprite(self, alpha):
+        if self.rotation_atlas is None: self.build_rotation_atlas()
+        rotation = self.rotation + (self.prev_rotation - self.rotation) * (1.0 - alpha)
+        center_y = self.rect.centery + (self.prev_y - self.rect.y) * (1.0 - alpha)
+        rotated_image, (off_x, off_y) = self.rotation_atlas.lookup(self.frame_index, rotation)
+        return rotated_image, (self.rect.centerx + off_x, round(center_y) + off_y)
+    def get_rotated(self, alpha=1.0):
+        """ alpha in [0, 1] interpolates between the previous and current sim step. """
+        rotated_image, topleft = self._rotated_sprite(alpha)
+        return rotated_image, rotated_image.get_rect(topleft=topleft)
+    def draw(self, surface, alpha=1.0):
+        rotated_image, topleft = self._rotated_sprite(alpha)
+        surface.blit(rotated_image, topleft)
     def reset(self):
         self.rect.center = (self.start_x + BIRD_WIDTH / 2, self.start_y + BIRD_HEIGHT / 2)
         self.velocity = 0.0; self.rotation = 0.0; self.frame_index = 0
-        self.last_animation_time = pygame.time.get_ticks()
+        self.animation_ms = 0.0
+        self.prev_y = self.rect.y; self.prev_rotation = self.rotation
         self.image = self.images[self.frame_index]
 
 
 # --- Pipe Manager Class ---
-# (PipeManager class remains the same)
+PIPE_RING_CAPACITY = 4 # Pipe pairs alive at once never exceed 3 (spacing >= 250 over a ~450px span)
+
+class PipePair:
+    """ One upper/lower pipe pair. Lives in PipeManager's ring and is recycled in place, never reallocated. """
+    __slots__ = ('upper', 'lower', 'x', 'prev_x', 'passed')
+    PARKED_X = -10000 # Idle records sit far off-screen so their rects can never collide
+    def __init__(self, pipe_width):
+        self.upper = pygame.Rect(self.PARKED_X, 0, pipe_width, 0)
+        self.lower = pygame.Rect(self.PARKED_X, 0, pipe_width, 0)
+        self.x = self.prev_x = float(self.PARKED_X); self.passed = True
+    def park(self):
+        self.upper.x = self.lower.x = self.PARKED_X
+        self.x = self.prev_x = float(self.PARKED_X); self.passed = True
+
+# game_instance only needs .score and .rng (Simulation provides both); scoring sounds are played by Game.
+# With a PipeCourse set (tournaments) pipes come from the course instead and neither is read.
+# Pipes are a fixed ring of PipePair records (oldest at self.head) updated in place, so the per-frame
+# update, collision and draw paths allocate nothing.
 class PipeManager:
     def __init__(self, pipe_img_surface, game_instance):
         self.pipe_img = pipe_img_surface
         self.game = game_instance
         self.pipe_width = self.pipe_img.get_width() if self.pipe_img else 50
         self.pipe_height = self.pipe_img.get_height() if self.pipe_img else HEIGHT
-        self.pipes = []
+        self.ring = [PipePair(self.pipe_width) for _ in range(PIPE_RING_CAPACITY)]
+        self.head = 0; self.count = 0
+        self.collision_rects = [r for p in self.ring for r in (p.upper, p.lower)] # Parked rects included; they never hit
         self.spacing = 250.0
         self.current_speed = float(BASE_PIPE_SPEED)
+        self.course = None; self.next_pipe = 0; self.next_offset = 0 # Tournament course, its next pipe and that pipe's x offset
         self._create_initial_pipes()
+    @property
+    def pipes(self):
+        """ Live pipe pairs, oldest (leftmost) first. Builds a list: for tools, not the per-frame path. """
+        cap = len(self.ring)
+        return [self.ring[(self.head + i) % cap] for i in range(self.count)]
     def _create_pipe_pair(self, x_pos):
         gap_reduction = (self.game.score // 15) * PIPE_GAP_REDUCTION_FACTOR
         current_gap = max(PIPE_GAP_MIN, PIPE_GAP_BASE - gap_reduction)
         min_h, max_h = 60, HEIGHT - GROUND_HEIGHT - current_gap - 60
         if max_h <= min_h: max_h = min_h + 10
         max_h_int = int(max_h)
-        h_upper = random.randint(min_h, max_h_int)
+        h_upper = self.game.rng.randint(min_h, max_h_int)
         h_lower = HEIGHT - GROUND_HEIGHT - (h_upper + current_gap)
         y_lower = h_upper + current_gap
-        upper_rect = pygame.Rect(round(x_pos), 0, self.pipe_width, h_upper)
-        lower_rect = pygame.Rect(round(x_pos), round(y_lower), self.pipe_width, round(h_lower))
-        return {'upper': upper_rect, 'lower': lower_rect, 'passed': False, 'x': float(x_pos)}
+        return self._place_pipe_pair(x_pos, h_upper, y_lower, h_lower)
+    def _spawn_course_pipe(self, x_pos):
+        """ Next pipe of the course at x_pos: an O(1) array read, no randomness and no score. """
+        _, h_upper, gap = self.course.pipe(self.next_pipe); self.next_pipe += 1
+        self.next_offset = self.course.pipe(self.next_pipe)[0]
+        return self._place_pipe_pair(x_pos, h_upper, h_upper + gap, HEIGHT - GROUND_HEIGHT - h_upper - gap)
+    def _place_pipe_pair(self, x_pos, h_upper, y_lower, h_lower):
+        cap = len(self.ring)
+        if self.count == cap: self.head = (self.head + 1) % cap; self.count -= 1 # Full: recycle the oldest
+        p = self.ring[(self.head + self.count) % cap]; self.count += 1
+        p.upper.x = round(x_pos); p.upper.height = h_upper
+        p.lower.x = round(x_pos); p.lower.y = round(y_lower); p.lower.height = round(h_lower)
+        p.x = p.prev_x = float(x_pos); p.passed = False
+        return p
     def _create_initial_pipes(self):
-        self.pipes.append(self._create_pipe_pair(float(WIDTH + 100)))
-        self.pipes.append(self._create_pipe_pair(float(WIDTH + 100) + self.spacing))
-    def update(self, bird_rect):
+        if self.course:
+            first = self._spawn_course_pipe(float(self.course.pipe(0)[0])) # The first offset is from the screen's left edge
+            self._spawn_course_pipe(first.x + self.next_offset)
+            return
+        self._create_pipe_pair(float(WIDTH + 100))
+        self._create_pipe_pair(float(WIDTH + 100) + self.spacing)
+    def set_course(self, course):
+        """ Stream pipes from a PipeCourse (None = random pipes again), starting over from its first pipe. """
+        self.course = course
+        self.reset()
+    def update(self, bird_rect, dt=1.0):
         score_increase = 0
         speed_increase = (self.game.score // 10) * PIPE_SPEED_INCREASE_FACTOR
         self.current_speed = min(float(BASE_PIPE_SPEED) + speed_increase, float(BASE_PIPE_SPEED) * 2.5)
         self.spacing = 250.0 + (self.current_speed - BASE_PIPE_SPEED) * 5.0
-        for pipe in self.pipes:
-            pipe['x'] -= self.current_speed
-            pipe['upper'].x = round(pipe['x'])
-            pipe['lower'].x = round(pipe['x'])
-            if not pipe['passed'] and bird_rect and pipe['upper'].right < bird_rect.left:
-                score_increase += SCORE_INCREMENT; pipe['passed'] = True
-                self.game.play_sfx(point_sound)
-        self.pipes = [p for p in self.pipes if p['upper'].right > 0]
-        if not self.pipes or self.pipes[-1]['upper'].x < WIDTH - self.spacing:
-            self.pipes.append(self._create_pipe_pair(float(WIDTH)))
+        ring = self.ring; cap = len(ring)
+        for i in range(self.count):
+            p = ring[(self.head + i) % cap]
+            p.prev_x = p.x
+            p.x -= self.current_speed * dt
+            p.upper.x = p.lower.x = round(p.x)
+            if not p.passed and bird_rect and p.upper.right < bird_rect.left:
+                score_increase += SCORE_INCREMENT; p.passed = True
+        while self.count and ring[self.head].upper.right <= 0: # Pipes leave in spawn order
+            ring[self.head].park(); self.head = (self.head + 1) % cap; self.count -= 1
+        if self.course:
+            # Course pipes sit exactly their offset behind the previous one, however big the frame steps are
+            x_pos = ring[(self.head + self.count - 1) % cap].x + self.next_offset if self.count else float(WIDTH)
+            if x_pos <= WIDTH: self._spawn_course_pipe(x_pos)
+        elif not self.count or ring[(self.head + self.count - 1) % cap].upper.x < WIDTH - self.spacing:
+            self._create_pipe_pair(float(WIDTH))
         return score_increase
-    def draw(self, surface):
+    def _draw_x(self, p, alpha):
+        return p.upper.x if alpha >= 1.0 else round(p.x + (p.prev_x - p.x) * (1.0 - alpha))
+    def draw_rects(self, alpha=1.0):
+        """ Screen areas draw() will cover, for dirty-rect tracking. """
+        rects = []
         for p in self.pipes:
+            dx = self._draw_x(p, alpha) - p.upper.x
+            rects.append(p.upper.move(dx, 0))
+            rects.append(pygame.Rect(p.lower.x + dx, p.lower.y, self.pipe_width, min(p.lower.height, self.pipe_height)))
+        return rects
+    def draw(self, surface, alpha=1.0):
+        ring = self.ring; cap = len(ring)
+        for i in range(self.count):
+            p = ring[(self.head + i) % cap]
+            draw_x = self._draw_x(p, alpha)
             if self.pipe_img:
-                upper_draw_y = p['upper'].height - self.pipe_height
-                surface.blit(self.pipe_img, (p['upper'].x, round(upper_draw_y)))
-                lower_draw_y = p['lower'].y
-                draw_height = min(p['lower'].height, self.pipe_height)
-                surface.blit(self.pipe_img, (p['lower'].x, round(lower_draw_y)), area=(0, 0, self.pipe_width, round(draw_height)))
+                upper_draw_y = p.upper.height - self.pipe_height
+                surface.blit(self.pipe_img, (draw_x, round(upper_draw_y)))
+                lower_draw_y = p.lower.y
+                draw_height = min(p.lower.height, self.pipe_height)
+                surface.blit(self.pipe_img, (draw_x, round(lower_draw_y)), area=(0, 0, self.pipe_width, round(draw_height)))
             else: # Fallback
-                pygame.draw.rect(surface, DARK_GRAY, p['upper'])
-                pygame.draw.rect(surface, DARK_GRAY, p['lower'])
+                dx = draw_x - p.upper.x
+                pygame.draw.rect(surface, DARK_GRAY, p.upper.move(dx, 0))
+                pygame.draw.rect(surface, DARK_GRAY, p.lower.move(dx, 0))
     def get_collision_rects(self):
-        return [p['upper'] for p in self.pipes] + [p['lower'] for p in self.pipes]
+        return self.collision_rects # Same list every frame; see PipePair.PARKED_X
     def reset(self):
-        self.pipes = []; self.current_speed = float(BASE_PIPE_SPEED); self.spacing = 250.0
+        for p in self.ring: p.park()
+        self.head = 0; self.count = 0; self.next_pipe = 0
+        self.current_speed = float(BASE_PIPE_SPEED); self.spacing = 250.0
         self._create_initial_pipes()
 
+# --- Tournament Courses ---
+class PipeCourse:
+    """ A tournament's whole pipe sequence, fixed by its seed and identical on every machine. Each pipe is
+        (x offset from the previous pipe, upper height, gap), packed in one array('H'); pipe(i) is O(1).
+        Generated with PipeManager's gap and spacing curves, taking the score at each spawn to be the pipes
+        a surviving player has passed by then. Cached on disk per seed.
+    """
+    MAGIC = b"FLPC"; VERSION = 1
+    HEADER = struct.Struct("<4sBIII") # magic, version, seed, rules checksum, pipe count
+    FIELDS = 3
+    _loaded = {} # (seed, pipe width) -> course, so restarts never touch the disk
+
+    def __init__(self, seed, data, rules=0):
+        self.seed = seed; self.data = data; self.rules = rules; self.count = len(data) // self.FIELDS
+
+    @staticmethod
+    def valid_seed(seed):
+        """ Seeds go into 32-bit fields of the course file and of replays. """
+        return isinstance(seed, int) and 0 <= seed < 2 ** 32
+
+    def pipe(self, index):
+        """ (x offset, upper height, gap) of pipe index; runs past the end wrap around to the start. """
+        i = (index % self.count) * self.FIELDS; data = self.data
+        return data[i], data[i + 1], data[i + 2]
+
+    @staticmethod
+    def rules_checksum(pipe_width):
+        """ Checksum of every setting a course depends on; a cached course built under other rules is regenerated. """
+        return zlib.crc32(repr((WIDTH, HEIGHT, GROUND_HEIGHT, PIPE_GAP_BASE, PIPE_GAP_MIN, PIPE_GAP_REDUCTION_FACTOR, BASE_PIPE_SPEED,
+                                PIPE_SPEED_INCREASE_FACTOR, SCORE_INCREMENT, pipe_width, COURSE_PIPES)).encode())
+
+    @classmethod
+    def generate(cls, seed, pipe_width=50, count=COURSE_PIPES):
+        rng = random.Random(seed); data = array('H')
+        bird_left = 50 # Bird start x
+        positions = [] # Each pipe's x at the start of the run
+        score = 0; passed = 0
+        for i in range(count):
+            # Spacing from the score at the previous spawn, as PipeManager.update sets it
+            speed = min(float(BASE_PIPE_SPEED) + (score // 10) * PIPE_SPEED_INCREASE_FACTOR, float(BASE_PIPE_SPEED) * 2.5)
+            offset = WIDTH + 100 if i == 0 else round(250.0 + (speed - BASE_PIPE_SPEED) * 5.0)
+            x = offset if i == 0 else positions[-1] + offset
+            # Pipe i reaches the screen edge after scrolling x - WIDTH; by then every pipe j with
+            # positions[j] + pipe_width - bird_left below that has passed the bird (the initial two see score 0)
+            while i >= 2 and positions[passed] + pipe_width - bird_left < x - WIDTH: passed += 1
+            score = passed * SCORE_INCREMENT
+            positions.append(x)
+            gap = max(PIPE_GAP_MIN, PIPE_GAP_BASE - (score // 15) * PIPE_GAP_REDUCTION_FACTOR) # Same bounds as _create_pipe_pair
+            min_h, max_h = 60, HEIGHT - GROUND_HEIGHT - gap - 60
+            if max_h <= min_h: max_h = min_h + 10
+            h_upper = rng.randint(min_h, int(max_h))
+            data.extend((offset, h_upper, round(h_upper + gap) - h_upper)) # Gap as the live game rounds the lower pipe's top
+        return cls(seed, data, cls.rules_checksum(pipe_width))
+
+    @staticmethod
+    def cache_path(seed):
+        return get_data_filepath(os.path.join(COURSE_CACHE_DIR, f"{seed}.flc"))
+
+    def save(self, path):
+        """ Atomic, like the high score: temp file then os.replace. A failed write leaves no temp file behind. """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True); tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.rules, self.count))
+                data = array('H', self.data)
+                if sys.byteorder != "little": data.byteswap()
+                f.write(data.tobytes())
+            os.replace(tmp_path, path)
+        except (OSError, struct.error):
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+
+    @classmethod
+    def read(cls, path, seed, rules):
+        """ The course stored at path, or None if it is missing, for another seed or built under other rules. """
+        try:
+            with open(path, 'rb') as f: raw = f.read()
+            magic, version, file_seed, file_rules, count = cls.HEADER.unpack_from(raw)
+            if magic != cls.MAGIC or version != cls.VERSION or file_seed != seed or file_rules != rules: return None
+            data = array('H'); data.frombytes(raw[cls.HEADER.size:cls.HEADER.size + count * cls.FIELDS * data.itemsize])
+            if sys.byteorder != "little": data.byteswap()
+            return cls(seed, data, rules) if len(data) == count * cls.FIELDS else None
+        except (OSError, struct.error): return None
+
+    @classmethod
+    def load(cls, seed, pipe_width=50):
+        """ Course for seed: from memory, the disk cache (or one shipped with the assets), else generated and cached. """
+        key = (seed, pipe_width)
+        if key in cls._loaded: return cls._loaded[key]
+        rules = cls.rules_checksum(pipe_width); path = cls.cache_path(seed)
+        course = cls.read(path, seed, rules) or cls.read(resource_path(os.path.join(COURSE_CACHE_DIR, f"{seed}.flc")), seed, rules)
+        if course is None:
+            start = time.perf_counter(); course = cls.generate(seed, pipe_width)
+            print(f"Generated course {seed}: {course.count} pipes in {(time.perf_counter() - start) * 1000:.1f} ms")
+            try: course.save(path)
+            except (OSError, struct.error) as e: print(f"Warning: Could not cache course to {path}: {e}")
+        cls._loaded[key] = course
+        return course
+
 # --- Background Manager Class ---
-# (BackgroundManager class remains the same)
+class ParallaxLayer:
+    """ One scrolling layer. Its wrap-around is baked into a strip of the tile repeated to cover
+        tile width + screen width, so any scroll position is a single area blit out of the strip. """
+    __slots__ = ('name', 'strip', 'tile_width', 'y', 'rect', 'factor', 'min_speed', 'solid', 'x', 'step')
+    def __init__(self, name, image, factor, min_speed, y, fallback_color=None):
+        self.name = name; self.factor = factor; self.min_speed = min_speed; self.y = y
+        self.solid = image is None # Solid colour: scrolling it would change nothing, so it never moves
+        if self.solid: image = pygame.Surface((WIDTH, HEIGHT - y)); image.fill(fallback_color)
+        tile_w, tile_h = image.get_size()
+        self.tile_width = tile_w
+        self.strip = pygame.Surface((tile_w * (WIDTH // tile_w + 2), tile_h), image.get_flags(), image)
+        per_pixel_alpha = bool(image.get_flags() & pygame.SRCALPHA)
+        if per_pixel_alpha: self.strip.fill((0, 0, 0, 0))
+        for i in range(self.strip.get_width() // tile_w):
+            # MAX onto transparent zeros copies the tile's RGBA exactly; a normal blit would blend its soft edges
+            self.strip.blit(image, (i * tile_w, 0), special_flags=pygame.BLEND_RGBA_MAX if per_pixel_alpha else 0)
+        self.rect = pygame.Rect(0, y, WIDTH, min(tile_h, HEIGHT - y)) # Screen area it covers
+        self.x = 0.0; self.step = 0.0 # Scroll position in (-tile_width, 0]; distance moved by the last update
+    def update(self, speed):
+        if self.solid: return
+        self.step = max(self.min_speed, speed * self.factor)
+        self.x -= self.step
+        if self.x <= -self.tile_width: self.x += self.tile_width
+    def offset(self, alpha=1.0):
+        """ x inside the strip where the screen starts, interpolated back by the unrendered part of the last step. """
+        return -round(self.x + self.step * (1.0 - alpha)) % self.tile_width
+    def draw(self, surface, alpha=1.0):
+        surface.blit(self.strip, (0, self.y), (self.offset(alpha), 0, WIDTH, self.rect.height))
+
 class BackgroundManager:
-    def __init__(self, bg_img, ground_img):
-        self.bg_image = bg_img; self.ground_image = ground_img
-        self.bg_width = self.bg_image.get_width() if self.bg_image else WIDTH
-        self.bg_x1 = 0.0; self.bg_x2 = float(self.bg_width)
-        self.ground_height = GROUND_HEIGHT
-        self.ground_width = self.ground_image.get_width() if self.ground_image else WIDTH
-        self.ground_x1 = 0.0; self.ground_x2 = float(self.ground_width)
-        self.ground_y = HEIGHT - self.ground_height
+    """ N-layer parallax scroller configured by PARALLAX_LAYERS; each layer costs one blit per frame. """
+    def __init__(self, images, layers=PARALLAX_LAYERS):
+        self.layers = [ParallaxLayer(name, images.get(name), factor, min_speed, y, color)
+                       for name, factor, min_speed, y, color in layers if images.get(name) is not None or color is not None]
+        self.ground_y = HEIGHT - GROUND_HEIGHT
         self.current_scroll_speed = float(BASE_PIPE_SPEED)
+        self.parallax = True # False (low quality tiers) holds the layers slower than the pipes still
+        self.depth_layers = True # False drops the layers between the sky and the ground (the sky is opaque, so no holes)
     def update(self, speed):
         self.current_scroll_speed = float(speed)
-        if self.bg_image:
-            scroll_speed_bg = max(1.0, self.current_scroll_speed * 0.3)
-            self.bg_x1 -= scroll_speed_bg; self.bg_x2 -= scroll_speed_bg
-            if self.bg_x1 <= -self.bg_width: self.bg_x1 = self.bg_x2 + self.bg_width
-            if self.bg_x2 <= -self.bg_width: self.bg_x2 = self.bg_x1 + self.bg_width
-        if self.ground_image:
-            scroll_speed_ground = self.current_scroll_speed
-            self.ground_x1 -= scroll_speed_ground; self.ground_x2 -= scroll_speed_ground
-            if self.ground_x1 <= -self.ground_width: self.ground_x1 = self.ground_x2 + self.ground_width
-            if self.ground_x2 <= -self.ground_width: self.ground_x2 = self.ground_x1 + self.ground_width
-    def draw(self, surface):
-        if self.bg_image:
-            surface.blit(self.bg_image, (round(self.bg_x1), 0)); surface.blit(self.bg_image, (round(self.bg_x2), 0))
-        else: surface.fill(BLUE)
-        if self.ground_image:
-            surface.blit(self.ground_image, (round(self.ground_x1), self.ground_y)); surface.blit(self.ground_image, (round(self.ground_x2), self.ground_y))
-        else: pygame.draw.rect(surface, GREEN, (0, self.ground_y, WIDTH, self.ground_height))
+        for layer in self.layers:
+            if self.parallax or layer.factor >= 1.0: layer.update(self.current_scroll_speed)
+            else: layer.step = 0.0
+    def hold(self):
+        """ Frame without scrolling: nothing left to interpolate. """
+        for layer in self.layers: layer.step = 0.0
+    def visible(self):
+        return self.layers if self.depth_layers or len(self.layers) <= 2 else [self.layers[0], self.layers[-1]]
+    def draw_positions(self, alpha=1.0):
+        """ (layer, strip offset) for each layer as draw() will place it. """
+        return [(layer, layer.offset(alpha)) for layer in self.visible()]
+    def draw(self, surface, alpha=1.0):
+        for layer in self.visible(): layer.draw(surface, alpha)
     def reset(self):
-        self.bg_x1 = 0.0; self.bg_x2 = float(self.bg_width); self.ground_x1 = 0.0; self.ground_x2 = float(self.ground_width)
+        for layer in self.layers: layer.x = 0.0; layer.step = 0.0
         self.current_scroll_speed = float(BASE_PIPE_SPEED)
 
 # --- UI Manager Class ---
-# (UIManager class remains the same)
 class UIManager:
-    def __init__(self, normal_font, big_font): self.font = normal_font; self.big_font = big_font; self.resume_button_rect = None
+    def __init__(self, normal_font, big_font):
+        self.font = normal_font; self.big_font = big_font; self.resume_button_rect = None
+        self.text_cache = OrderedDict() # (text, font, color, antialias) -> Surface, in LRU order
+        # Overlays are composed once and reused; the game-over panel is rebuilt only when its values change
+        self.pause_overlay = None; self.flash_overlay = None
+        self.game_over_panel = None; self.game_over_key = None
+        self.pause_tint = True; self.flash_mode = "full" # Set from the quality tier
+    def _text_surface(self, txt, fnt, clr, antialias=True):
+        """ Cached fnt.render(); a changed value is simply a new key, old ones age out of the LRU. """
+        key = (txt, fnt, clr, antialias)
+        surf = self.text_cache.get(key)
+        if surf is not None: self.text_cache.move_to_end(key); return surf
+        surf = fnt.render(txt, antialias, clr)
+        self.text_cache[key] = surf
+        if len(self.text_cache) > TEXT_CACHE_SIZE: self.text_cache.popitem(last=False)
+        return surf
     def _render_text(self, txt, fnt, clr, center_pos=None, topleft_pos=None):
         if fnt:
-            try: surf = fnt.render(str(txt), True, clr); rect = surf.get_rect(center=center_pos) if center_pos else surf.get_rect(topleft=topleft_pos if topleft_pos else (0,0)); return surf, rect
+            try: surf = self._text_surface(str(txt), fnt, clr); rect = surf.get_rect(center=center_pos) if center_pos else surf.get_rect(topleft=topleft_pos if topleft_pos else (0,0)); return surf, rect
             except Exception: pass
         return None, None
-    def draw_start_screen(self, surface, high_score_value):
+    def _draw_counter(self, surface, label, value, fnt, clr, topleft=None, topright=None):
+        """ label + value composed from the cached label and per-digit glyphs, so a score change rasterizes nothing. """
+        if not fnt: return
+        try: glyphs = [self._text_surface(label, fnt, clr)] + [self._text_surface(d, fnt, clr) for d in str(value)]
+        except Exception: return
+        x, y = topleft if topleft else (topright[0] - sum(g.get_width() for g in glyphs), topright[1])
+        for g in glyphs: surface.blit(g, (x, y)); x += g.get_width()
+    def draw_start_screen(self, surface, high_score_value, top_scores=()):
         title_surf, title_rect = self._render_text("Flappy Bird", self.big_font, BLACK, center_pos=(WIDTH // 2, HEIGHT // 4))
         instr_surf, instr_rect = self._render_text("Press SPACE to Start", self.font, BLACK, center_pos=(WIDTH // 2, HEIGHT // 2))
         hs_surf, hs_rect = self._render_text(f"High Score: {high_score_value}", self.font, BLACK, center_pos=(WIDTH // 2, HEIGHT * 3 // 4))
         if title_surf: surface.blit(title_surf, title_rect)
         if instr_surf: surface.blit(instr_surf, instr_rect)
         if hs_surf: surface.blit(hs_surf, hs_rect)
+        if top_scores:
+            top_surf, top_rect = self._render_text("Top runs: " + "  ".join(map(str, top_scores)), self.font, BLACK, center_pos=(WIDTH // 2, HEIGHT * 3 // 4 + 30))
+            if top_surf: surface.blit(top_surf, top_rect)
     def draw_playing_ui(self, surface, score_value, high_score_value):
-        score_surf, score_rect = self._render_text(f"Score: {score_value}", self.font, BLACK, topleft_pos=(10, 10))
-        hs_surf, hs_rect = self._render_text(f"Hi: {high_score_value}", self.font, BLACK)
-        if score_surf: surface.blit(score_surf, score_rect)
-        if hs_surf: hs_rect.topright = (WIDTH - 10, 10); surface.blit(hs_surf, hs_rect)
-    def draw_pause_overlay(self, surface):
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA); overlay.fill(SEMI_TRANSPARENT_BLACK); surface.blit(overlay, (0, 0))
+        self._draw_counter(surface, "Score: ", score_value, self.font, BLACK, topleft=(10, 10))
+        self._draw_counter(surface, "Hi: ", high_score_value, self.font, BLACK, topright=(WIDTH - 10, 10))
+    def _build_pause_overlay(self):
+        tint = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA); tint.fill(SEMI_TRANSPARENT_BLACK)
+        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA) # Text and button, kept off the tint so edges blend as before
         pause_surf, pause_rect = self._render_text("Paused", self.big_font, WHITE, center_pos=(WIDTH // 2, HEIGHT // 3))
-        if pause_surf: surface.blit(pause_surf, pause_rect)
+        if pause_surf: overlay.blit(pause_surf, pause_rect)
         self.resume_button_rect = pygame.Rect(0, 0, 150, 50); self.resume_button_rect.center = (WIDTH // 2, HEIGHT // 2)
-        pygame.draw.rect(surface, DARK_GRAY, self.resume_button_rect, border_radius=10)
-        pygame.draw.rect(surface, WHITE, self.resume_button_rect, width=2, border_radius=10)
+        pygame.draw.rect(overlay, DARK_GRAY, self.resume_button_rect, border_radius=10)
+        pygame.draw.rect(overlay, WHITE, self.resume_button_rect, width=2, border_radius=10)
         res_surf, res_rect = self._render_text("Resume", self.font, WHITE, center_pos=self.resume_button_rect.center)
-        if res_surf: surface.blit(res_surf, res_rect)
+        if res_surf: overlay.blit(res_surf, res_rect)
+        self.pause_overlay = (tint, overlay, overlay.get_bounding_rect())
+    def draw_pause_overlay(self, surface):
+        if self.pause_overlay is None: self._build_pause_overlay()
+        tint, overlay, content_rect = self.pause_overlay
+        if self.pause_tint: surface.blit(tint, (0, 0)) # Full-screen alpha blend, the costly part
+        surface.blit(overlay, content_rect, area=content_rect)
         return self.resume_button_rect
-    def draw_game_over_screen(self, surface, score_value, high_score_value, is_new_high):
-        go_surf, go_rect = self._render_text("Game Over!", self.big_font, WHITE, center_pos=(WIDTH // 2, HEIGHT // 3))
-        nhs_surf, nhs_rect = (self._render_text("New High Score!", self.font, RED, center_pos=(WIDTH // 2, HEIGHT // 2 - 50))) if is_new_high else (None, None)
-        score_surf, score_rect = self._render_text(f"Score: {score_value}", self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT // 2 - 10))
-        hs_surf, hs_rect = self._render_text(f"High Score: {high_score_value}", self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT // 2 + 30))
-        instr_surf, instr_rect = self._render_text("Press SPACE to Restart", self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT * 2 // 3 + 20))
-        all_rects = [r for r in [go_rect, score_rect, hs_rect, instr_rect, nhs_rect] if r]
-        if not all_rects: return
+    def _build_game_over_panel(self, score_value, high_score_value, is_new_high, top_scores=()):
+        texts = [self._render_text("Game Over!", self.big_font, WHITE, center_pos=(WIDTH // 2, HEIGHT // 3))]
+        if is_new_high: texts.append(self._render_text("New High Score!", self.font, RED, center_pos=(WIDTH // 2, HEIGHT // 2 - 50)))
+        texts.append(self._render_text(f"Score: {score_value}", self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT // 2 - 10)))
+        texts.append(self._render_text(f"High Score: {high_score_value}", self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT // 2 + 30)))
+        if top_scores: texts.append(self._render_text("Top runs: " + "  ".join(map(str, top_scores)), self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT // 2 + 65)))
+        texts.append(self._render_text("Press SPACE to Restart", self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT * 2 // 3 + 20)))
+        texts = [(s, r) for s, r in texts if s]
+        if not texts: self.game_over_panel = None; return
+        all_rects = [r for s, r in texts]
         min_y, max_y = min(r.top for r in all_rects), max(r.bottom for r in all_rects)
         h = max_y - min_y + 60
         bg_rect = pygame.Rect(0, 0, WIDTH * 0.85, h); bg_rect.center = (WIDTH // 2, HEIGHT // 2)
-        pygame.draw.rect(surface, BLACK, bg_rect, border_radius=15)
-        if go_surf: surface.blit(go_surf, go_rect)
-        if is_new_high and nhs_surf: surface.blit(nhs_surf, nhs_rect)
-        if score_surf: surface.blit(score_surf, score_rect)
-        if hs_surf: surface.blit(hs_surf, hs_rect)
-        if instr_surf: surface.blit(instr_surf, instr_rect)
+        bounds = bg_rect.unionall(all_rects)
+        panel = pygame.Surface(bounds.size, pygame.SRCALPHA) # Transparent outside the rounded corners
+        pygame.draw.rect(panel, BLACK, bg_rect.move(-bounds.x, -bounds.y), border_radius=15)
+        for s, r in texts: panel.blit(s, r.move(-bounds.x, -bounds.y))
+        self.game_over_panel = (panel, bounds.topleft)
+    def draw_game_over_screen(self, surface, score_value, high_score_value, is_new_high, top_scores=()):
+        key = (score_value, high_score_value, is_new_high, tuple(top_scores))
+        if key != self.game_over_key: self.game_over_key = key; self._build_game_over_panel(*key)
+        if self.game_over_panel: surface.blit(*self.game_over_panel)
     def draw_credits(self, surface, scroll_pos, lines):
         surface.fill(BLACK)
         line_h = self.font.get_linesize() if self.font else 25
@@ -523,149 +1032,1129 @@ class UIManager:
                  if surf: surface.blit(surf, rect)
         quit_surf, quit_rect = self._render_text("Press ESC to Quit", self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT - 30))
         if quit_surf: surface.blit(quit_surf, quit_rect)
+    def attract_banner(self):
+        """ The demo-mode caption and where it goes (on the ground strip). """
+        return self._render_text("DEMO - press any key", self.font, WHITE, center_pos=(WIDTH // 2, HEIGHT - GROUND_HEIGHT // 2))
+    def draw_attract_banner(self, surface):
+        surf, rect = self.attract_banner()
+        if surf: surface.blit(surf, rect)
     def draw_flash(self, surface):
-        flash_surface = pygame.Surface((WIDTH, HEIGHT)); flash_surface.fill(WHITE); flash_surface.set_alpha(150)
-        surface.blit(flash_surface, (0, 0))
+        if self.flash_mode == "off": return
+        if self.flash_mode == "reduced": # Opaque fills around the edge, a fraction of the blend's cost
+            b = FLASH_REDUCED_BORDER
+            for rect in ((0, 0, WIDTH, b), (0, HEIGHT - b, WIDTH, b), (0, b, b, HEIGHT - 2 * b), (WIDTH - b, b, b, HEIGHT - 2 * b)): surface.fill(WHITE, rect)
+            return
+        if self.flash_overlay is None:
+            self.flash_overlay = pygame.Surface((WIDTH, HEIGHT)); self.flash_overlay.fill(WHITE); self.flash_overlay.set_alpha(150)
+        surface.blit(self.flash_overlay, (0, 0))
+
+
+# --- Dirty Rectangle Renderer ---
+class DirtyRectRenderer:
+    """ Per-layer dirty-rectangle tracking for display.update(rects).
+        Each frame every visible layer reports a key (anything that changes when its pixels change)
+        and the rects it covers. A layer whose key changed dirties its old and new rects; a layer that
+        disappeared dirties its old ones. When nothing is dirty the frame can be skipped entirely.
+    """
+    def __init__(self, size):
+        self.screen_rect = pygame.Rect((0, 0), size)
+        self.last = {}; self.current = {}; self.dirty = []
+        self.full_redraw = True
+    def invalidate(self):
+        self.full_redraw = True
+    def mark(self, layer, key, rects):
+        self.current[layer] = (key, rects)
+        old = self.last.get(layer)
+        if old is None: self.dirty.extend(rects)
+        elif old[0] != key: self.dirty.extend(old[1]); self.dirty.extend(rects)
+    def finish(self):
+        """ Rects to redraw and push this frame ([] = nothing changed). Starts tracking the next frame. """
+        for layer, (key, rects) in self.last.items():
+            if layer not in self.current: self.dirty.extend(rects)
+        dirty = [r.clip(self.screen_rect) for r in self.dirty]
+        dirty = [r for r in dirty if r.w > 0 and r.h > 0]
+        self.last = self.current; self.current = {}; self.dirty = []
+        if self.full_redraw or sum(r.w * r.h for r in dirty) > self.screen_rect.w * self.screen_rect.h * DIRTY_FULL_FRAME_FRACTION:
+            self.full_redraw = False
+            return [self.screen_rect.copy()]
+        return dirty
+
+
+# --- Frame Profiler ---
+class FrameProfiler:
+    """ Per-section frame times (ms) for the last PROFILER_FRAMES frames, in fixed preallocated rings.
+        lap() adds to the frame being built, end_frame() commits it. Feeds the F3 HUD and the exit export. """
+    SECTIONS = ("events", "update", "background", "pipes", "ghosts", "bird", "ui", "present", "capture", "frame")
+    def __init__(self, size=PROFILER_FRAMES):
+        self.size = size
+        self.ring = {name: [0.0] * size for name in self.SECTIONS}
+        self.current = dict.fromkeys(self.SECTIONS, 0.0)
+        self.index = 0; self.count = 0; self.frames = 0; self.dropped = 0
+        self.show_hud = False; self.hud = None; self.hud_rect = None; self.hud_version = 0; self.font = None
+        self.latency = deque(maxlen=INPUT_LATENCY_SAMPLES) # Input press -> present (ms), one per flap
+        self.quality = None # Name of the current quality tier, shown in the HUD and export
+
+    def lap(self, section, start):
+        """ Charge the time since start to section; returns now, so laps chain. """
+        now = time.perf_counter(); self.current[section] += (now - start) * 1000.0
+        return now
+
+    def end_frame(self, frame_ms):
+        """ Commit the frame; frame_ms is the whole frame interval including the clock.tick wait. """
+        current = self.current; current["frame"] = frame_ms; i = self.index
+        for name in self.SECTIONS: self.ring[name][i] = current[name]; current[name] = 0.0
+        self.index = (i + 1) % self.size; self.count = min(self.count + 1, self.size); self.frames += 1
+        if frame_ms > FRAME_MS * DROPPED_FRAME_FACTOR: self.dropped += 1
+        if self.show_hud and self.frames % PROFILER_HUD_REFRESH == 0: self.hud = None # Rebuilt on next draw
+
+    def record_latency(self, ms):
+        self.latency.append(ms)
+
+    def samples(self, section):
+        """ The ring for one section, oldest frame first. """
+        ring = self.ring[section]
+        return ring[:self.count] if self.count < self.size else ring[self.index:] + ring[:self.index]
+
+    def stats(self):
+        """ {section: (p50, p99, max)} over the frames in the ring. """
+        out = {}
+        for name in self.SECTIONS:
+            s = sorted(self.samples(name))
+            if s: out[name] = (s[len(s) // 2], s[min(len(s) - 1, int(len(s) * 0.99))], s[-1])
+        s = sorted(self.latency)
+        if s: out["input"] = (s[len(s) // 2], s[min(len(s) - 1, int(len(s) * 0.99))], s[-1]) # Per flap, not per frame
+        return out
+
+    def toggle_hud(self):
+        self.show_hud = not self.show_hud; self.hud = None
+
+    def hud_surface(self):
+        """ The HUD panel and its rect, rebuilt every PROFILER_HUD_REFRESH frames (hud_version changes with it). """
+        if self.hud is None:
+            if self.font is None: self.font = pygame.font.Font(None, 20)
+            rows = [("ms", "p50", "p99", "max")] + [(name, f"{p50:.2f}", f"{p99:.2f}", f"{mx:.2f}") for name, (p50, p99, mx) in self.stats().items()]
+            rows.append((f"dropped {self.dropped} / {self.frames}", "", "", ""))
+            if self.quality: rows.append((f"quality {self.quality}", "", "", ""))
+            line_h = self.font.get_linesize(); col_right = (0, 120, 170, 220)
+            panel = pygame.Surface((228, len(rows) * line_h + 8), pygame.SRCALPHA); panel.fill((0, 0, 0, 170))
+            for r, row in enumerate(rows):
+                for c, txt in enumerate(row):
+                    if not txt: continue
+                    surf = self.font.render(txt, True, WHITE)
+                    panel.blit(surf, (6 if c == 0 else col_right[c] - surf.get_width(), 4 + r * line_h))
+            self.hud = panel; self.hud_rect = panel.get_rect(bottomleft=(0, HEIGHT)); self.hud_version += 1
+        return self.hud, self.hud_rect
+
+    def draw_hud(self, surface):
+        if self.show_hud: surface.blit(*self.hud_surface())
+
+    def export(self, path):
+        """ Write the ring to path: JSON (summary stats + per-frame rows) for .json, CSV otherwise. """
+        try:
+            rows = list(zip(*(self.samples(name) for name in self.SECTIONS)))
+            with open(path, 'w') as f:
+                if path.lower().endswith(".json"):
+                    json.dump({"frame_budget_ms": FRAME_MS, "frames_total": self.frames, "dropped": self.dropped, "quality": self.quality,
+                               "stats": {name: dict(zip(("p50", "p99", "max"), v)) for name, v in self.stats().items()},
+                               "frames": [dict(zip(self.SECTIONS, row)) for row in rows]}, f, indent=1)
+                else:
+                    f.write(",".join(self.SECTIONS) + "\n")
+                    for row in rows: f.write(",".join(f"{v:.4f}" for v in row) + "\n")
+            print(f"Frame profile written: {path} ({len(rows)} frames, {self.dropped} dropped)")
+        except Exception as e: print(f"Warning: Could not write frame profile to {path}: {e}")
+
+
+# --- Quality Governor ---
+class QualityGovernor:
+    """ Picks a QUALITY_TIERS level from the p90 of recent frame work times (everything but the wait for the next frame).
+        A full window over budget drops a level at once; a level is raised only after QUALITY_UPGRADE_FRAMES with
+        clear headroom, and a raise that has to be undone within that time doubles the wait, so a machine sitting
+        right at the edge settles on one tier instead of toggling. Each change clears the window.
+    """
+    def __init__(self, tiers=QUALITY_TIERS, enabled=QUALITY_GOVERNOR):
+        self.tiers = tiers; self.enabled = enabled; self.level = 0
+        self.window = deque(maxlen=QUALITY_WINDOW_FRAMES)
+        self.calm_frames = 0 # Frames in a row with p90 under the upgrade threshold
+        self.upgrade_frames = QUALITY_UPGRADE_FRAMES
+        self.since_upgrade = None # Frames since the last raise (None = no raise pending judgement)
+        self.changes = 0; self.frames_at = [0] * len(tiers) # Telemetry: level changes, frames spent per level
+
+    @property
+    def tier(self): return self.tiers[self.level]
+    @property
+    def name(self): return self.tier[0]
+
+    def pin(self, name):
+        """ Hold the named tier and stop adapting (False if there is no such tier). """
+        for level, tier in enumerate(self.tiers):
+            if tier[0] == name: self.level = level; self.enabled = False; return True
+        return False
+
+    def observe(self, work_ms):
+        """ Feed one frame's work time (ms); True when the level changed. """
+        self.frames_at[self.level] += 1
+        if not self.enabled: return False
+        self.window.append(work_ms)
+        if self.since_upgrade is not None: self.since_upgrade += 1
+        if len(self.window) < self.window.maxlen: return False
+        p90 = sorted(self.window)[int(len(self.window) * 0.9)]
+        if p90 > FRAME_MS * QUALITY_DOWNGRADE_FRACTION:
+            if self.level == len(self.tiers) - 1: return False
+            if self.since_upgrade is not None and self.since_upgrade < self.upgrade_frames:
+                self.upgrade_frames = min(self.upgrade_frames * 2, QUALITY_UPGRADE_FRAMES * 16) # Raised too early
+            return self._set(self.level + 1, p90)
+        if p90 < FRAME_MS * QUALITY_UPGRADE_FRACTION and self.level > 0:
+            self.calm_frames += 1
+            if self.calm_frames >= self.upgrade_frames: return self._set(self.level - 1, p90)
+        else: self.calm_frames = 0
+        return False
+
+    def _set(self, level, p90):
+        raised = level < self.level
+        print(f"Quality {self.name} -> {self.tiers[level][0]} (p90 frame work {p90:.1f} ms of {FRAME_MS:.1f})")
+        self.level = level; self.changes += 1
+        self.window.clear(); self.calm_frames = 0; self.since_upgrade = 0 if raised else None
+        return True
+
+    def report(self):
+        total = sum(self.frames_at) or 1
+        shares = ", ".join(f"{tier[0]} {n * 100 / total:.0f}%" for tier, n in zip(self.tiers, self.frames_at) if n)
+        return f"Quality: ended on {self.name} after {self.changes} changes ({shares or 'no frames'})"
+
+# --- Frame Capture ---
+class FrameCapture:
+    """ Records the frames Game.draw produces. grab() copies the screen's pixels (one RGBX memcpy, ~0.1 ms) into
+        a bounded queue; an encoder thread turns them into the output, picked by path:
+        .gif -> animated GIF (needs Pillow), .mp4/.mkv/.webm/.mov/.avi -> ffmpeg in its own process,
+        .rgb/.raw -> raw RGBX frames, anything else -> a directory of numbered PNGs.
+        Live capture (block=False) drops a frame when the encoder falls behind instead of stalling the game.
+    """
+    VIDEO_EXTS = (".mp4", ".mkv", ".webm", ".mov", ".avi")
+
+    def __init__(self, path, size=(WIDTH, HEIGHT), fps=TARGET_FPS, block=False):
+        ext = os.path.splitext(path)[1].lower()
+        self.kind = "gif" if ext == ".gif" else "video" if ext in self.VIDEO_EXTS else "raw" if ext in (".rgb", ".raw") else "png"
+        if self.kind == "gif": need_pillow("GIF capture")
+        self.ffmpeg = shutil.which("ffmpeg") if self.kind == "video" else None
+        if self.kind == "video" and not self.ffmpeg:
+            print(f"Warning: ffmpeg not found; capturing raw frames instead of {path}.")
+            self.kind = "raw"; path = os.path.splitext(path)[0] + ".rgb"
+        self.path = path; self.size = size; self.fps = fps; self.block = block
+        self.queue = queue.Queue(maxsize=CAPTURE_QUEUE_FRAMES)
+        self.grabbed = 0; self.dropped = 0; self.written = 0; self.grab_s = 0.0; self.error = None
+        self.thread = threading.Thread(target=self._encode, name="capture-encoder", daemon=True)
+        self.thread.start()
+
+    def grab(self, surface):
+        """ Queue a copy of surface's current pixels. """
+        start = time.perf_counter()
+        data = pygame.image.tobytes(surface, "RGBX") # Format-independent, and ffmpeg reads it as rgb0
+        self.grab_s += time.perf_counter() - start # The copy only: blocking puts wait on the encoder by design
+        try: self.queue.put(data, block=self.block); self.grabbed += 1
+        except queue.Full: self.dropped += 1
+
+    def _encode(self):
+        try: sink = self._open()
+        except Exception as e: self.error = e; print(f"Warning: Capture to {self.path} failed: {e}"); sink = None
+        while True:
+            data = self.queue.get()
+            if data is None: break
+            if sink is None: continue # Keep draining so the game never blocks on a dead encoder
+            try: sink(data); self.written += 1
+            except Exception as e: self.error = e; print(f"Warning: Capture to {self.path} failed: {e}"); sink = None
+        try: self._finish()
+        except Exception as e: self.error = e; print(f"Warning: Could not finish capture {self.path}: {e}")
+
+    def _open(self):
+        """ Set up the output; returns the per-frame writer. """
+        w, h = self.size
+        if self.kind == "png":
+            os.makedirs(self.path, exist_ok=True)
+            return lambda data: pygame.image.save(pygame.image.frombuffer(data, self.size, "RGBX"), os.path.join(self.path, f"frame_{self.written:06d}.png"))
+        if self.kind == "raw":
+            self.out = open(self.path, 'wb')
+            return self.out.write
+        if self.kind == "video":
+            self.process = subprocess.Popen([self.ffmpeg, "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb0", "-s", f"{w}x{h}",
+                                             "-r", str(self.fps), "-i", "-", "-pix_fmt", "yuv420p", self.path], stdin=subprocess.PIPE)
+            return self.process.stdin.write
+        self.gif_frames = []; every = max(1, round(self.fps / CAPTURE_GIF_FPS)) # GIF
+        gif_size = (max(1, round(w * CAPTURE_GIF_SCALE)), max(1, round(h * CAPTURE_GIF_SCALE)))
+        def add_gif_frame(data):
+            if self.written % every: return
+            image = Image.frombytes("RGBX", self.size, data).convert("RGB").resize(gif_size)
+            self.gif_frames.append(image.quantize(256)) # Palette now: 1 byte per pixel held until the end
+        return add_gif_frame
+
+    def _finish(self):
+        w, h = self.size
+        if self.kind == "raw":
+            self.out.close()
+            print(f"Raw frames: ffmpeg -f rawvideo -pix_fmt rgb0 -s {w}x{h} -r {self.fps} -i {self.path} -pix_fmt yuv420p out.mp4")
+        elif self.kind == "video":
+            self.process.stdin.close(); self.process.wait()
+        elif self.kind == "gif" and self.gif_frames:
+            every = max(1, round(self.fps / CAPTURE_GIF_FPS))
+            self.gif_frames[0].save(self.path, save_all=True, append_images=self.gif_frames[1:], duration=round(1000.0 * every / self.fps), loop=0)
+
+    def close(self):
+        """ Finish encoding everything queued, then report. """
+        self.queue.put(None); self.thread.join()
+        avg_us = self.grab_s / max(1, self.grabbed + self.dropped) * 1e6
+        print(f"Capture: {self.written} frames -> {self.path} ({self.dropped} dropped, {avg_us:.0f} us per frame copy)")
+        return self.error is None
+
+def render_replay(replay, out_path):
+    """ Render a replay headless at full speed (no frame clock) into a FrameCapture; nothing is dropped. """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy"); os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    try: capture = FrameCapture(out_path, block=True)
+    except ImportError as e: print(f"Capture failed: {e}"); return False
+    game = Game(persist=False, dirty_rects=False)
+    game.start_replay(replay)
+    tail = 0
+    while tail < CAPTURE_TAIL_FRAMES:
+        game.update(); game._draw_layers(1.0); capture.grab(game.screen)
+        if game.replay_player.finished and game.game_state != MARIO_EVENT: tail += 1
+    game.run_stats.close()
+    return capture.close()
+
+def render_top_runs(count, out_path):
+    """ Highlight reels: render the best count stored runs, the rank added to out_path (run_1.mp4, run_2.mp4, ...). """
+    store = RunStatsStore(); runs = store.ghosts(count); store.close()
+    if not runs: print("No stored runs with replays to render."); return False
+    base, ext = os.path.splitext(out_path); ok = True
+    for rank, (score, ended_at, seed, data) in enumerate(runs, 1):
+        print(f"Rendering #{rank}: score {score}, seed {seed}")
+        ok = render_replay(Replay.from_bytes(data), f"{base}_{rank}{ext}") and ok
+    return ok
+
+# --- Simulation Core (Headless) ---
+# Events returned by Simulation.step(); Game turns them into sounds, high-score saves and UI state changes.
+SIM_FLAP = "flap"; SIM_POINT = "point"; SIM_COLLISION = "collision"
+SIM_MARIO = "mario"; SIM_CAUGHT = "caught"
+
+class Simulation:
+    """ Display-free game rules: bird physics, pipes, score and the play state machine.
+        Needs no window, mixer or wall clock, so bots and regression tests can
+        step it as fast as the CPU allows. One step() == one frame at TARGET_FPS.
+        All randomness comes from self.rng, so (seed, actions) reproduces a run exactly.
+        dt > 1 takes bigger steps for throughput; collisions are swept, so nothing tunnels through pipes.
+    """
+    def __init__(self, bird_images=None, pipe_img=None, seed=None, dt=1.0, swept=SWEPT_COLLISION, pixel_collision=PIXEL_COLLISION, course=None):
+        self.score = 0
+        self.dt = dt
+        self.swept = swept
+        self.state = START_SCREEN
+        self.frame = 0
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.bird = Bird(50, HEIGHT // 2, bird_images)
+        self.pipe_manager = PipeManager(pipe_img, self)
+        if course: self.pipe_manager.set_course(course) # Tournament: pipes from the course, not self.rng
+        self.mario_x = WIDTH // 2 - MARIO_WIDTH // 2
+        self.mario_y = -MARIO_HEIGHT
+        self.mario_rect = pygame.Rect(self.mario_x, self.mario_y, MARIO_WIDTH, MARIO_HEIGHT)
+        self.set_pixel_collision(pixel_collision, pipe_img)
+
+    def set_pixel_collision(self, enabled, pipe_img=None):
+        """ Turn the mask narrow phase on (masks from the bird frames and pipe_img) or off. """
+        self.bird_masks = None; self.pipe_mask = None
+        if enabled:
+            self.bird_masks = [pygame.mask.from_surface(img) for img in self.bird.images]
+            self.pipe_mask = pygame.mask.from_surface(pipe_img) if pipe_img else pygame.mask.Mask((self.pipe_manager.pipe_width, HEIGHT), fill=True)
+
+    @property
+    def done(self):
+        return self.state in (GAME_OVER, CREDITS)
+
+    def reset(self, seed=None):
+        if seed is not None: self.seed = seed; self.rng.seed(seed)
+        self.score = 0 # Before pipe reset: the first gaps are sized from the score
+        self.frame = 0
+        self.bird.reset()
+        self.pipe_manager.reset()
+        self.mario_x = WIDTH // 2 - MARIO_WIDTH // 2
+        self.mario_y = -MARIO_HEIGHT
+        self.mario_rect.topleft = (self.mario_x, self.mario_y)
+        self.state = PLAYING
+
+    def step(self, action=False):
+        """ Advance one frame. action is truthy to flap. Returns the list of SIM_* events for this frame. """
+        events = []
+        if self.state == PLAYING:
+            if action: self.bird.flap(); events.append(SIM_FLAP)
+            self.bird.update(self.dt)
+            score_increase = self.pipe_manager.update(self.bird.rect, self.dt)
+            if score_increase: self.score += score_increase; events.append(SIM_POINT)
+            bird_mask = self.bird_masks[self.bird.frame_index] if self.bird_masks else None
+            # Legacy mode sweeps over zero motion, i.e. tests only this frame's positions (plus the optional mask)
+            prev_y = self.bird.prev_y if self.swept else self.bird.rect.y
+            if check_swept_collision(self.bird.rect, prev_y, self.pipe_manager, bird_mask, self.pipe_mask, self.swept):
+                self.state = GAME_OVER; events.append(SIM_COLLISION)
+            elif self.score >= MARIO_TRIGGER_SCORE:
+                self.state = MARIO_EVENT; events.append(SIM_MARIO)
+                self.mario_y = -MARIO_HEIGHT
+                self.mario_x = self.bird.rect.centerx - MARIO_WIDTH // 2
+                self.mario_rect.topleft = (self.mario_x, self.mario_y)
+        elif self.state == MARIO_EVENT:
+            self.mario_y += MARIO_FALL_SPEED * self.dt
+            self.mario_rect.topleft = (self.mario_x, self.mario_y)
+            if check_mario_collision(self.bird.rect, self.mario_rect):
+                self.state = CREDITS; events.append(SIM_CAUGHT)
+        self.frame += 1
+        return events
+
+    def snapshot(self):
+        """ Copy of all mutable sim state; restore() puts it back (replay seeking). """
+        b = self.bird; pm = self.pipe_manager
+        bird = (tuple(b.rect), b.velocity, b.rotation, b.frame_index, b.animation_ms, b.prev_y, b.prev_rotation)
+        pipes = tuple((tuple(p.upper), tuple(p.lower), p.x, p.prev_x, p.passed) for p in pm.ring)
+        return (self.score, self.state, self.frame, self.rng.getstate(), self.mario_x, self.mario_y,
+                bird, (pm.head, pm.count, pm.current_speed, pm.spacing, pm.next_pipe, pipes))
+
+    def restore(self, snap):
+        self.score, self.state, self.frame, rng_state, self.mario_x, self.mario_y, bird, pipes = snap
+        self.rng.setstate(rng_state)
+        self.mario_rect.topleft = (self.mario_x, self.mario_y)
+        b = self.bird
+        rect, b.velocity, b.rotation, b.frame_index, b.animation_ms, b.prev_y, b.prev_rotation = bird
+        b.rect.update(rect); b.image = b.images[b.frame_index % len(b.images)]
+        pm = self.pipe_manager
+        pm.head, pm.count, pm.current_speed, pm.spacing, pm.next_pipe, records = pipes
+        if pm.course: pm.next_offset = pm.course.pipe(pm.next_pipe)[0]
+        for p, (upper, lower, x, prev_x, passed) in zip(pm.ring, records):
+            p.upper.update(upper); p.lower.update(lower); p.x = x; p.prev_x = prev_x; p.passed = passed
+
+    def run(self, policy, max_frames=None, seed=None):
+        """ Headless driver: reset, then step with policy(sim) -> action until done or max_frames. Returns the score. """
+        self.reset(seed)
+        while not self.done and (max_frames is None or self.frame < max_frames):
+            self.step(policy(self))
+        return self.score
+
+
+# --- Batched Simulation (NumPy) ---
+class BatchSimulation:
+    """ n independent lanes of the Simulation rules, held in NumPy arrays and stepped in one call.
+        Mirrors Bird.update, PipeManager.update/_create_pipe_pair and check_swept_collision, including
+        pygame's integer Rect rounding. Lanes that finish (collision or Mario trigger) reset themselves.
+    """
+    MAX_PIPES = PIPE_RING_CAPACITY
+
+    def __init__(self, n, pipe_width=50, seed=None, dt=1.0, swept=SWEPT_COLLISION):
+        need_numpy("BatchSimulation")
+        self.n = n
+        self.dt = dt
+        self.swept = swept
+        self.pipe_width = pipe_width
+        self.rng = np.random.default_rng(seed)
+        self.bird_x = 50 # Bird rect left, same for every lane
+        self.bird_y = np.zeros(n) # Bird rect top (always integral, like pygame.Rect)
+        self.velocity = np.zeros(n); self.rotation = np.zeros(n)
+        self.score = np.zeros(n, dtype=np.int64); self.frame = np.zeros(n, dtype=np.int64)
+        self.current_speed = np.full(n, float(BASE_PIPE_SPEED))
+        shape = (n, self.MAX_PIPES)
+        self.pipe_x = np.zeros(shape) # Float x, as pipe['x']
+        self.pipe_upper_h = np.zeros(shape) # upper rect height
+        self.pipe_lower_y = np.zeros(shape) # lower rect top
+        self.pipe_passed = np.zeros(shape, dtype=bool); self.pipe_active = np.zeros(shape, dtype=bool)
+        self.pipe_tail = np.zeros(n, dtype=np.int64) # Slot of the newest pipe in each lane
+        self._lanes = np.arange(n)
+        self.reset()
+
+    def reset(self, lanes=None):
+        """ Reset all lanes, or only those selected by a boolean mask / index array. """
+        lanes = self._lanes if lanes is None else np.asarray(lanes)
+        if lanes.dtype == bool: lanes = np.flatnonzero(lanes)
+        self.bird_y[lanes] = HEIGHT // 2
+        self.velocity[lanes] = 0.0; self.rotation[lanes] = 0.0
+        self.score[lanes] = 0; self.frame[lanes] = 0
+        self.current_speed[lanes] = float(BASE_PIPE_SPEED)
+        self.pipe_active[lanes] = False
+        self.pipe_tail[lanes] = self.MAX_PIPES - 1
+        self._spawn(lanes, float(WIDTH + 100))
+        self._spawn(lanes, float(WIDTH + 100) + 250.0)
+
+    def _spawn(self, lanes, x_pos):
+        # Same gap and height rules as PipeManager._create_pipe_pair
+        gap = np.maximum(PIPE_GAP_MIN, PIPE_GAP_BASE - (self.score[lanes] // 15) * PIPE_GAP_REDUCTION_FACTOR)
+        max_h = HEIGHT - GROUND_HEIGHT - gap - 60
+        max_h = np.where(max_h <= 60, 70, max_h)
+        h_upper = self.rng.integers(60, max_h.astype(np.int64) + 1)
+        slot = (self.pipe_tail[lanes] + 1) % self.MAX_PIPES
+        self.pipe_x[lanes, slot] = x_pos
+        self.pipe_upper_h[lanes, slot] = h_upper
+        self.pipe_lower_y[lanes, slot] = np.rint(h_upper + gap)
+        self.pipe_passed[lanes, slot] = False
+        self.pipe_active[lanes, slot] = True
+        self.pipe_tail[lanes] = slot
+
+    def step(self, actions):
+        """ Advance every lane one frame. actions: bool array (True = flap).
+            Returns (score, done) arrays; score is the value before any auto-reset.
+        """
+        flap = np.asarray(actions, dtype=bool); dt = self.dt
+        self.velocity[flap] = float(FLAP_STRENGTH); self.rotation[flap] = float(BIRD_MAX_ROTATION + 5)
+        # Bird.update
+        prev_y = self.bird_y
+        self.velocity += GRAVITY * dt
+        y = self.bird_y + self.velocity * dt
+        y = np.copysign(np.floor(np.abs(y) + 0.5), y) # Rect assignment rounds half away from zero
+        self.bird_y = np.maximum(y, -BIRD_HEIGHT * BIRD_TOP_CLAMP_FACTOR)
+        self.rotation += np.where(self.velocity > 1, -BIRD_ROTATION_VELOCITY, BIRD_ROTATION_VELOCITY * 1.5) * dt
+        np.clip(self.rotation, -90.0, float(BIRD_MAX_ROTATION), out=self.rotation)
+        # PipeManager.update (speed and spawn gaps use the score from before this frame)
+        speed_increase = (self.score // 10) * PIPE_SPEED_INCREASE_FACTOR
+        self.current_speed = np.minimum(float(BASE_PIPE_SPEED) + speed_increase, float(BASE_PIPE_SPEED) * 2.5)
+        spacing = 250.0 + (self.current_speed - BASE_PIPE_SPEED) * 5.0
+        prev_px = np.rint(self.pipe_x)
+        self.pipe_x -= self.current_speed[:, None] * dt
+        px = np.rint(self.pipe_x) # round() on PipePair.x
+        right = px + self.pipe_width
+        active = self.pipe_active
+        newly_passed = active & ~self.pipe_passed & (right < self.bird_x)
+        self.pipe_passed |= newly_passed
+        active &= right > 0
+        # check_swept_collision (pipes that just spawned at WIDTH can't reach the bird, so test before spawning)
+        if not self.swept: prev_px = px; prev_y = self.bird_y # Zero-length sweep == per-frame overlap test
+        r0 = self.bird_x - prev_px; r1 = self.bird_x - px; dr = r1 - r0
+        moving = dr != 0; safe_dr = np.where(moving, dr, 1.0)
+        t_a = (-BIRD_WIDTH - r0) / safe_dr; t_b = (self.pipe_width - r0) / safe_dr
+        still_overlap = (r0 > -BIRD_WIDTH) & (r0 < self.pipe_width)
+        t_lo = np.where(moving, np.maximum(0.0, np.minimum(t_a, t_b)), np.where(still_overlap, 0.0, 1.0))
+        t_hi = np.where(moving, np.minimum(1.0, np.maximum(t_a, t_b)), np.where(still_overlap, 1.0, 0.0))
+        dy = (self.bird_y - prev_y)[:, None]
+        top_lo = prev_y[:, None] + dy * t_lo; top_hi = prev_y[:, None] + dy * t_hi
+        in_pipe = active & (t_lo < t_hi) & ((np.minimum(top_lo, top_hi) < self.pipe_upper_h) | (np.maximum(top_lo, top_hi) + BIRD_HEIGHT > self.pipe_lower_y))
+        hit = (self.bird_y + BIRD_HEIGHT >= HEIGHT - GROUND_HEIGHT) | in_pipe.any(axis=1)
+        last_x = px[self._lanes, self.pipe_tail]
+        need_pipe = ~active.any(axis=1) | (last_x < WIDTH - spacing)
+        if need_pipe.any(): self._spawn(np.flatnonzero(need_pipe), float(WIDTH))
+        self.score += newly_passed.sum(axis=1) * SCORE_INCREMENT
+        self.frame += 1
+        done = hit | (self.score >= MARIO_TRIGGER_SCORE)
+        score = self.score.copy()
+        if done.any(): self.reset(done)
+        return score, done
+
+
+# --- Replays ---
+def _encode_varints(values):
+    out = bytearray()
+    for v in values:
+        while v >= 0x80: out.append((v & 0x7F) | 0x80); v >>= 7
+        out.append(v)
+    return bytes(out)
+
+def _decode_varints(data, count):
+    values = []; v = shift = 0
+    for byte in data:
+        v |= (byte & 0x7F) << shift; shift += 7
+        if not byte & 0x80:
+            values.append(v); v = shift = 0
+            if len(values) == count: break
+    if len(values) != count: raise ValueError("Truncated replay data")
+    return values
+
+class Replay:
+    """ A run as its seed, sim settings and the frame indices it flapped on; a few hundred bytes.
+        File: fixed little-endian HEADER, then the flap frames as varint deltas.
+    """
+    MAGIC = b"FLPR"; VERSION = 1
+    HEADER = struct.Struct("<4sBIHHBdIII") # magic, version, seed, pipe w, pipe h, flags, dt, frames, score, flap count
+    FLAG_SWEPT = 1; FLAG_PIXEL = 2; FLAG_COURSE = 4 # FLAG_COURSE: pipes from the PipeCourse for seed (tournaments)
+
+    def __init__(self, seed, pipe_width=50, pipe_height=HEIGHT, dt=1.0, swept=SWEPT_COLLISION, pixel_collision=PIXEL_COLLISION, course=False):
+        self.seed = seed; self.pipe_width = pipe_width; self.pipe_height = pipe_height
+        self.dt = dt; self.swept = swept; self.pixel_collision = pixel_collision; self.course = course
+        self.flaps = []; self.frames = 0; self.score = 0
+
+    @classmethod
+    def for_simulation(cls, sim):
+        pm = sim.pipe_manager
+        return cls(sim.seed, pm.pipe_width, pm.pipe_height, sim.dt, sim.swept, sim.bird_masks is not None, pm.course is not None)
+
+    def record_flap(self, frame): self.flaps.append(frame)
+    def finish(self, frames, score): self.frames = frames; self.score = score
+
+    def to_bytes(self):
+        flags = (self.FLAG_SWEPT if self.swept else 0) | (self.FLAG_PIXEL if self.pixel_collision else 0) | (self.FLAG_COURSE if self.course else 0)
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.pipe_width, self.pipe_height, flags,
+                                  self.dt, self.frames, self.score, len(self.flaps))
+        deltas = [f - p for f, p in zip(self.flaps, [0] + self.flaps[:-1])]
+        return header + _encode_varints(deltas)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, seed, pipe_w, pipe_h, flags, dt, frames, score, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION: raise ValueError("Not a replay file (or unsupported version)")
+        replay = cls(seed, pipe_w, pipe_h, dt, bool(flags & cls.FLAG_SWEPT), bool(flags & cls.FLAG_PIXEL), bool(flags & cls.FLAG_COURSE))
+        frame = 0
+        for delta in _decode_varints(data[cls.HEADER.size:], count): frame += delta; replay.flaps.append(frame)
+        replay.frames = frames; replay.score = score
+        return replay
+
+    def save(self, path):
+        self.write(path, self.to_bytes())
+
+    @staticmethod
+    def write(path, data):
+        """ Atomic, like the high score: temp file, fsync, os.replace - a crash never leaves a truncated replay. """
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f: f.write(data); f.flush(); os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except OSError:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f: return cls.from_bytes(f.read())
+
+    def make_simulation(self, bird_images=None, pipe_img=None):
+        """ Simulation configured like the recording one. Headless, a blank pipe surface supplies the size. """
+        if pipe_img is None: pipe_img = pygame.Surface((self.pipe_width, self.pipe_height))
+        if self.pixel_collision and not bird_images: print("Warning: replay used pixel collision; without the game's sprites playback may diverge.")
+        return Simulation(bird_images, pipe_img, seed=self.seed, dt=self.dt, swept=self.swept, pixel_collision=self.pixel_collision,
+                          course=PipeCourse.load(self.seed, self.pipe_width) if self.course else None)
+
+class ReplayPlayer:
+    """ Drives a Simulation from a Replay. Keeps a snapshot every REPLAY_SNAPSHOT_INTERVAL frames
+        so seek() only re-simulates from the nearest one.
+    """
+    def __init__(self, replay, sim):
+        self.replay = replay; self.sim = sim
+        self.flap_frames = set(replay.flaps)
+        sim.reset(replay.seed)
+        self.snapshots = {0: sim.snapshot()}
+
+    @property
+    def finished(self):
+        return self.sim.done or self.sim.frame >= self.replay.frames
+
+    def step(self):
+        frame = self.sim.frame
+        if frame % REPLAY_SNAPSHOT_INTERVAL == 0 and frame not in self.snapshots: self.snapshots[frame] = self.sim.snapshot()
+        return self.sim.step(frame in self.flap_frames)
+
+    def seek(self, frame):
+        frame = max(0, min(frame, self.replay.frames))
+        base = max(f for f in self.snapshots if f <= frame)
+        self.sim.restore(self.snapshots[base])
+        while self.sim.frame < frame and not self.sim.done: self.step()
+
+    def run_to_end(self):
+        """ Play headless as fast as possible. Returns the final score. """
+        while not self.finished: self.step()
+        return self.sim.score
+
+def verify_replay(path):
+    """ Re-simulate a replay file headless; True if it reproduces the recorded score and length. """
+    replay = Replay.load(path)
+    player = ReplayPlayer(replay, replay.make_simulation())
+    score = player.run_to_end()
+    ok = score == replay.score and player.sim.frame == replay.frames
+    print(f"Replay {path}: seed {replay.seed}, {len(replay.flaps)} flaps, {player.sim.frame} frames, score {score} "
+          f"(recorded {replay.score}) -> {'OK' if ok else 'MISMATCH'}")
+    return ok
+
+
+# --- Ghost Racing ---
+class GhostRace:
+    """ Recorded runs flown together as translucent ghost birds. A bird's height depends only on its flaps,
+        so the replays need no pipes: each ghost is a lane of Bird.update vectorized in NumPy arrays.
+        Sprites are tinted and pre-rotated once; a frame is one Surface.blits() call, no per-ghost rotate.
+    """
+    def __init__(self, bird_images, tints=GHOST_TINTS, alpha=GHOST_ALPHA, step=GHOST_ROTATION_STEP):
+        need_numpy("GhostRace")
+        start = Bird(50, HEIGHT // 2, bird_images).rect # Where every run begins
+        self.x = start.centerx; self.start_y = float(start.y); self.half_h = start.height // 2
+        self.frame_count = len(bird_images)
+        tinted = []
+        for tint in tints:
+            for img in bird_images:
+                surf = img.copy(); surf.fill(tuple(tint) + (alpha,), special_flags=pygame.BLEND_RGBA_MULT); tinted.append(surf)
+        atlas = RotationAtlas(tinted, step, None, both_ends=False) # lookup is vectorised over the single grid
+        self.atlas = atlas; self.angle_count = len(atlas.frames[0])
+        entries = [e for frame_entries in atlas.frames for e in frame_entries] # Flat: (tint, frame, angle) -> sprite
+        self.sprites = [surf for surf, _ in entries]
+        self.off_x = np.array([off[0] for _, off in entries]); self.off_y = np.array([off[1] for _, off in entries])
+        self.max_w = max(s.get_width() for s in self.sprites); self.max_h = max(s.get_height() for s in self.sprites)
+        self.tint_count = len(tints)
+        self.shown = None # Ghosts drawn, best first (quality tier); None = all
+        self.load([])
+
+    def load(self, replays):
+        """ Fly these Replays (best first: tints cycle by rank). """
+        n = len(replays)
+        self.n = n
+        self.end = np.array([r.frames for r in replays], dtype=np.int64) # Each ghost is drawn up to its crash frame
+        self.dt = np.array([r.dt for r in replays], dtype=float)
+        self.base = (np.arange(n) % self.tint_count) * self.frame_count # First sprite row of each ghost's tint
+        flaps = [np.asarray(r.flaps, dtype=np.int64) for r in replays]
+        frames = np.concatenate(flaps) if flaps else np.zeros(0, dtype=np.int64)
+        ghost_ids = np.repeat(np.arange(n), [len(fl) for fl in flaps])
+        order = np.argsort(frames, kind="stable") # All flaps in frame order, so a frame's flaps are one slice
+        self.flap_frames = frames[order]; self.flap_ghosts = ghost_ids[order]
+        self._set_last_frame()
+        self.restart()
+
+    def restart(self):
+        n = self.n; self.frame = 0
+        self.y = np.full(n, self.start_y); self.velocity = np.zeros(n); self.rotation = np.zeros(n)
+        self.animation_ms = np.zeros(n); self.frame_index = np.zeros(n, dtype=np.int64)
+        self.prev_y = self.y.copy(); self.prev_rotation = self.rotation.copy()
+
+    @property
+    def finished(self):
+        return self.frame > self.last_frame
+
+    def set_shown(self, count):
+        """ Draw only the best count ghosts (None = all); the race restarts once those have landed. """
+        self.shown = count; self._set_last_frame()
+
+    def _set_last_frame(self):
+        ends = self.end[:self.shown]
+        self.last_frame = int(ends.max()) if len(ends) else 0
+
+    def step(self):
+        """ Advance every ghost one sim frame: its recorded flaps, then Bird.update. """
+        if not self.n: return
+        lo, hi = np.searchsorted(self.flap_frames, (self.frame, self.frame + 1))
+        flapping = self.flap_ghosts[lo:hi]
+        self.velocity[flapping] = float(FLAP_STRENGTH); self.rotation[flapping] = float(BIRD_MAX_ROTATION + 5)
+        dt = self.dt
+        self.prev_y = self.y; self.prev_rotation = self.rotation.copy()
+        self.velocity += GRAVITY * dt
+        y = self.y + self.velocity * dt
+        y = np.copysign(np.floor(np.abs(y) + 0.5), y) # Rect assignment rounds half away from zero
+        self.y = np.maximum(y, -BIRD_HEIGHT * BIRD_TOP_CLAMP_FACTOR)
+        if self.frame_count > 1:
+            self.animation_ms += FRAME_MS * dt
+            turn = self.animation_ms > ANIMATION_SPEED_MS
+            self.frame_index[turn] = (self.frame_index[turn] + 1) % self.frame_count; self.animation_ms[turn] = 0.0
+        self.rotation += np.where(self.velocity > 1, -BIRD_ROTATION_VELOCITY, BIRD_ROTATION_VELOCITY * 1.5) * dt
+        np.clip(self.rotation, -90.0, float(BIRD_MAX_ROTATION), out=self.rotation)
+        self.frame += 1
+
+    def _placed(self, alpha):
+        """ Sprite indices and top-left corners of the ghosts still flying, interpolated like Bird._rotated_sprite. """
+        live = np.flatnonzero(self.frame <= self.end[:self.shown])
+        rotation = self.rotation[live] + (self.prev_rotation[live] - self.rotation[live]) * (1.0 - alpha)
+        center_y = np.rint(self.y[live] + self.half_h + (self.prev_y[live] - self.y[live]) * (1.0 - alpha))
+        angle = np.clip(np.rint((rotation - RotationAtlas.MIN_ANGLE) / self.atlas.step), 0, self.angle_count - 1).astype(np.int64)
+        sprite = (self.base[live] + self.frame_index[live]) * self.angle_count + angle
+        return sprite, self.x + self.off_x[sprite], center_y.astype(np.int64) + self.off_y[sprite]
+
+    def bounds(self, alpha=1.0):
+        """ Rect covering every ghost drawn at alpha, or None when none are flying. """
+        sprite, xs, ys = self._placed(alpha)
+        if not len(sprite): return None
+        left, top = int(xs.min()), int(ys.min())
+        return pygame.Rect(left, top, int(xs.max()) - left + self.max_w, int(ys.max()) - top + self.max_h)
+
+    def draw(self, surface, alpha=1.0):
+        sprite, xs, ys = self._placed(alpha)
+        if not len(sprite): return
+        sprites = self.sprites
+        surface.blits([(sprites[i], (x, y)) for i, x, y in zip(sprite.tolist(), xs.tolist(), ys.tolist())], doreturn=False)
+
+# --- Autopilot (Neuro-evolution) ---
+class Autopilot:
+    """ Tiny MLP policy: 6 features of the bird, the next pipe and the pipe speed -> tanh hidden layer -> flap
+        when the output is positive. The genome is the flat weight list [w1 (hidden x inputs), b1, w2, b2]. """
+    INPUTS = 6
+    def __init__(self, genome, hidden=AUTOPILOT_HIDDEN):
+        n = self.INPUTS; g = [float(w) for w in genome]
+        if len(g) != self.genome_size(hidden): raise ValueError(f"genome has {len(g)} weights, expected {self.genome_size(hidden)}")
+        self.genome = g; self.hidden = hidden
+        self.w1 = [g[i * n:(i + 1) * n] for i in range(hidden)]; off = hidden * n
+        self.b1 = g[off:off + hidden]; off += hidden
+        self.w2 = g[off:off + hidden]; self.b2 = g[off + hidden]
+
+    @staticmethod
+    def genome_size(hidden=AUTOPILOT_HIDDEN):
+        return hidden * (Autopilot.INPUTS + 2) + 1
+
+    @staticmethod
+    def features(sim):
+        """ Bird height and velocity, distance to the next pipe (from PipeManager.pipes), the gap edges relative to the bird
+            and the pipe speed (0 at BASE_PIPE_SPEED, 1 at its 2.5x cap). """
+        bird = sim.bird; rect = bird.rect
+        for p in sim.pipe_manager.pipes:
+            if p.upper.right > rect.left: dx, gap_top, gap_bottom = p.upper.x - rect.right, p.upper.bottom, p.lower.top; break
+        else: dx, gap_top, gap_bottom = WIDTH, (HEIGHT - GROUND_HEIGHT - PIPE_GAP_BASE) // 2, (HEIGHT - GROUND_HEIGHT + PIPE_GAP_BASE) // 2
+        speed = (sim.pipe_manager.current_speed - BASE_PIPE_SPEED) / (BASE_PIPE_SPEED * 1.5)
+        return (rect.centery / HEIGHT, bird.velocity / 10.0, dx / WIDTH, (rect.top - gap_top) / HEIGHT, (gap_bottom - rect.bottom) / HEIGHT, speed)
+
+    def decide(self, sim):
+        """ Policy for Simulation.run / Game: True = flap this frame. """
+        x0, x1, x2, x3, x4, x5 = self.features(sim); out = self.b2
+        for (a0, a1, a2, a3, a4, a5), b, w_out in zip(self.w1, self.b1, self.w2):
+            out += w_out * math.tanh(b + a0 * x0 + a1 * x1 + a2 * x2 + a3 * x3 + a4 * x4 + a5 * x5)
+        return out > 0.0
+
+    def save(self, path=None, **info):
+        path = path or get_data_filepath(AUTOPILOT_FILE)
+        with open(path, 'w') as f: json.dump(dict(info, hidden=self.hidden, genome=self.genome), f)
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        """ The checkpointed autopilot (next to the exe/script, else shipped with the assets), or None. """
+        for p in ([path] if path else [get_data_filepath(AUTOPILOT_FILE), resource_path(AUTOPILOT_FILE)]):
+            if not os.path.exists(p): continue
+            try:
+                with open(p, 'r') as f: data = json.load(f)
+                return cls(data["genome"], data.get("hidden", AUTOPILOT_HIDDEN))
+            except Exception as e: print(f"Warning: Could not load autopilot from {p}: {e}")
+        print("No trained autopilot found (run with --train-autopilot).")
+        return None
+
+def evaluate_genome(job):
+    """ Process-pool worker: (genome, seeds, max_frames) -> (fitness, mean score). Fitness is the mean over the
+        shared seeds of score * 1000 + frames survived (score first, survival time breaks ties). """
+    genome, seeds, max_frames = job
+    pilot = Autopilot(genome); sim = Simulation(); total = 0; scores = 0
+    for seed in seeds:
+        score = sim.run(pilot.decide, max_frames, seed)
+        total += score * 1000 + sim.frame; scores += score
+    return total / len(seeds), scores / len(seeds)
+
+def train_autopilot(generations, workers=None, seed=None, path=None):
+    """ Evolve autopilot genomes: each generation every genome plays the same AUTOPILOT_SEEDS_PER_GEN
+        courses, spread over a process pool; the elite survive and breed (uniform crossover +
+        gaussian mutation). The elite are then re-scored on AUTOPILOT_VALIDATION_SEEDS courses fixed for the
+        whole run, and the best of them is checkpointed whenever it beats the checkpoint on those courses.
+        Results depend only on seed, not on the number of workers. """
+    import multiprocessing
+    workers = workers or os.cpu_count() or 1
+    path = path or get_data_filepath(AUTOPILOT_FILE)
+    rng = random.Random(seed); size = Autopilot.genome_size()
+    validation = [rng.getrandbits(32) for _ in range(AUTOPILOT_VALIDATION_SEEDS)]
+    population = [[rng.gauss(0.0, 1.0) for _ in range(size)] for _ in range(AUTOPILOT_POPULATION)]
+    previous = Autopilot.load(path) if os.path.exists(path) else None
+    best_fitness = None; start = time.perf_counter()
+    print(f"Training autopilot: {generations} generations x {AUTOPILOT_POPULATION} genomes on {workers} worker(s)")
+    with multiprocessing.Pool(workers) as pool:
+        if previous and len(previous.genome) == size:
+            population[0] = previous.genome
+            best_fitness, best_score = evaluate_genome((previous.genome, validation, AUTOPILOT_MAX_FRAMES)) # The bar a new checkpoint must clear
+            print(f"Resuming from {path} (validation {best_fitness:.0f}, score {best_score:.1f})")
+        for gen in range(generations):
+            seeds = [rng.getrandbits(32) for _ in range(AUTOPILOT_SEEDS_PER_GEN)]
+            gen_start = time.perf_counter()
+            results = pool.map(evaluate_genome, [(g, seeds, AUTOPILOT_MAX_FRAMES) for g in population], chunksize=1)
+            fitness = [r[0] for r in results]
+            ranked = sorted(range(len(population)), key=lambda i: (-fitness[i], i))
+            elite = [population[i] for i in ranked[:AUTOPILOT_ELITE]]; top, top_score = results[ranked[0]]
+            checked = pool.map(evaluate_genome, [(g, validation, AUTOPILOT_MAX_FRAMES) for g in elite], chunksize=1)
+            pick = max(range(len(elite)), key=lambda i: (checked[i][0], -i)); val, val_score = checked[pick]
+            note = ""
+            if best_fitness is None or val > best_fitness:
+                best_fitness = val; Autopilot(elite[pick]).save(path, fitness=val, score=val_score, generation=gen, seed=seed); note = " -> checkpoint"
+            print(f"Gen {gen + 1}/{generations}: best {top:.0f} (score {top_score:.1f}), mean {sum(fitness) / len(fitness):.0f}, "
+                  f"validation {val:.0f} (score {val_score:.1f}), {time.perf_counter() - gen_start:.1f} s{note}")
+            population = [list(g) for g in elite]
+            while len(population) < AUTOPILOT_POPULATION:
+                a, b = rng.choice(elite), rng.choice(elite)
+                population.append([(x if rng.random() < 0.5 else y) + rng.gauss(0.0, AUTOPILOT_MUTATION) for x, y in zip(a, b)])
+    print(f"Training done in {time.perf_counter() - start:.1f} s; best genome in {path}")
+    return best_fitness
+
+# --- Input ---
+class InputManager:
+    """ Timestamped input. Every event gets a perf_counter stamp when it is taken off pygame's queue, and the
+        game loop polls about every INPUT_POLL_MS while it waits for the next frame, so a press is stamped within
+        a millisecond of arriving rather than at the next frame start. Flaps wait here until the fixed-timestep
+        loop reaches the sim step whose slice of real time contains their stamp.
+    """
+    def __init__(self):
+        self.events = [] # (stamp, event) polled but not yet handled
+        self.flaps = [] # Stamps of flap presses not yet applied, oldest first
+
+    def poll(self):
+        now = time.perf_counter()
+        for event in pygame.event.get(): self.events.append((now, event))
+
+    def drain(self):
+        """ Everything since the last drain as (stamp, event), including a final poll. """
+        self.poll()
+        events = self.events; self.events = []
+        return events
+
+    def queue_flap(self, stamp): self.flaps.append(stamp)
+    def clear_flaps(self): self.flaps.clear()
+
+    def take_flaps(self, deadline):
+        """ Remove and return the stamps of flaps pressed before deadline (a perf_counter time). """
+        flaps = self.flaps; i = 0
+        while i < len(flaps) and flaps[i] < deadline: i += 1
+        taken = flaps[:i]; del flaps[:i]
+        return taken
+
+    def wait_until(self, deadline):
+        """ Sleep until deadline in INPUT_POLL_MS slices, stamping whatever arrives meanwhile. """
+        while True:
+            self.poll()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0: return
+            time.sleep(min(remaining, INPUT_POLL_MS / 1000.0))
+
+# --- Audio Manager ---
+class AudioManager:
+    """ In-process audio on pygame.mixer. Music streams from disk through mixer.music and loops inside the
+        mixer (no gap, no reload at the end); each SFX owns a small pool of reserved channels, so rapid
+        flaps recycle their own voices instead of cutting off a point or collision sound. """
+    def __init__(self):
+        self.sound_enabled = False; self.music_enabled = False; self.music_paused = False
+        self.pools = {} # SFX name -> [sound, channels, next channel to reuse]
+
+    def load(self, bundle_sounds=None, bundle_mixer=None):
+        """ Start the mixer and load SFX (bundle PCM first, loose WAVs otherwise) and music. Safe on a worker thread. """
+        if not init_mixer(): print("SFX disabled."); print("Music disabled."); return
+        try:
+            print("Loading SFX (Pygame - WAV)...")
+            bundle_sounds = bundle_sounds or {}
+            bundle_ok = list(pygame.mixer.get_init() or []) == bundle_mixer
+            if bundle_sounds and not bundle_ok: print(" - Bundle SFX format differs from mixer; loading WAV files.")
+            voices = sum(SFX_VOICES.values())
+            pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), voices))
+            pygame.mixer.set_reserved(voices) # Keep any plain Sound.play() off the SFX channels
+            pools = {}; channel_id = 0; sfx_ok = True
+            for name, count in SFX_VOICES.items():
+                if bundle_ok and name in bundle_sounds: sound = pygame.mixer.Sound(buffer=bundle_sounds[name])
+                else: path = find_asset_path(name, [".wav"]); sound = pygame.mixer.Sound(path) if path else None
+                if not sound: print(f" - {name}.wav missing."); sfx_ok = False; continue
+                pools[name] = [sound, [pygame.mixer.Channel(channel_id + i) for i in range(count)], 0]; channel_id += count
+            self.pools = pools; self.sound_enabled = sfx_ok
+            if self.sound_enabled: print("SFX loaded.")
+            else: print("SFX disabled.")
+        except Exception as e: print(f" SFX Load Err: {e}. Disabled."); self.sound_enabled = False
+        try:
+            print("Loading Music (Pygame - streamed)...")
+            music_path = find_asset_path("background_music", [".wav", ".ogg"])
+            if music_path: pygame.mixer.music.load(music_path); self.music_enabled = True; print("Music loaded.")
+            else: print(" - background_music.wav missing."); print("Music disabled.")
+        except Exception as e: print(f" Music Load Warn: Err:{e}. Disabled."); self.music_enabled = False
+
+    def play_sfx(self, name):
+        """ Play on the sound's next pool channel (round-robin, so a busy pool restarts its oldest voice). """
+        pool = self.pools.get(name) if self.sound_enabled else None
+        if not pool: return
+        sound, channels, index = pool
+        try: channels[index].play(sound); pool[2] = (index + 1) % len(channels)
+        except Exception as e: print(f"SFX Play Error: {e}"); self.sound_enabled = False
+
+    def play_music(self):
+        """ Start the loop from the top unless it is already playing or paused. """
+        if not self.music_enabled or self.music_paused: return
+        try:
+            if not pygame.mixer.music.get_busy(): pygame.mixer.music.play(loops=-1)
+        except Exception as e: print(f"Music Play Error: {e}"); self.music_enabled = False
+
+    def pause_music(self):
+        if self.music_enabled and not self.music_paused:
+            try: pygame.mixer.music.pause(); self.music_paused = True
+            except Exception: pass
+
+    def resume_music(self):
+        if not self.music_enabled: return
+        if self.music_paused:
+            try: pygame.mixer.music.unpause(); self.music_paused = False
+            except Exception: self.music_enabled = False
+        else: self.play_music()
 
+    def stop_music(self):
+        if self.music_enabled:
+            try: pygame.mixer.music.stop()
+            except Exception: pass
+        self.music_paused = False
+
+    def shutdown(self):
+        self.stop_music(); self.sound_enabled = self.music_enabled = False
 
 # --- Game Class ---
 class Game:
-    def __init__(self):
-        if not pygame.get_init(): pygame.init()
-        if not pygame.display.get_init(): pygame.display.init()
-        if not pygame.font.get_init(): pygame.font.init()
-        if not pygame.mixer.get_init() and PYGAME_MIXER_OK: pygame.mixer.init()
+    def __init__(self, seed=None, dirty_rects=DIRTY_RECT_RENDERING, persist=True):
+        self.persist = persist # False: no high score, replay or run-stats writes (benchmarks, demos)
+        self.startup_times = OrderedDict(); self.startup_mark = STARTUP_T0 # Phase name -> ms, reported after the first frame
+        self._startup_phase("import")
+        try:
+            if not pygame.display.get_init(): pygame.display.init()
+            if not pygame.font.get_init(): pygame.font.init()
+        except pygame.error as pg_err: print(f"Fatal: Pygame init failed: {pg_err}"); sys.exit()
 
         try: self.screen = pygame.display.set_mode((WIDTH, HEIGHT)); pygame.display.set_caption("Flappy Bird OOP - Final")
         except pygame.error as e: print(f"Fatal: Display mode failed: {e}"); pygame.quit(); sys.exit()
+        self._startup_phase("display")
 
         self.clock = pygame.time.Clock()
         self.running = True
         self.game_state = START_SCREEN
-        self.score = 0
         self.assets = self._load_assets()
-        self._load_audio()
-
-        self.bird = Bird(50, HEIGHT // 2, self.assets['bird_images'])
-        self.pipe_manager = PipeManager(self.assets['pipe'], self)
-        self.background_manager = BackgroundManager(self.assets['background'], self.assets['ground'])
+        self._startup_phase("assets")
+        self.audio = AudioManager()
+        self.audio_thread = None; self.audio_ready = False; self.audio_applied = False
+        if not BACKGROUND_AUDIO_LOADING: self._load_audio(); self._startup_phase("audio")
+
+        self.seed_rng = random.Random(seed) # Picks each run's seed; pass seed to make a whole session repeatable
+        self.tournament_seed = None # Set by start_tournament(): every run plays that seed's fixed course
+        self.sim = Simulation(self.assets['bird_images'], self.assets['pipe'], seed=self.seed_rng.getrandbits(32))
+        self.bird = self.sim.bird
+        self.bird.build_rotation_atlas()
+        self.pipe_manager = self.sim.pipe_manager
+        self.background_manager = BackgroundManager(self.assets)
         self.ui_manager = UIManager(self.assets['font'], self.assets['big_font'])
 
-        self.mario_img = self.assets['mario']
-        self.mario_x = WIDTH // 2 - MARIO_WIDTH // 2
-        self.mario_y = -MARIO_HEIGHT
-        self.mario_rect = self.mario_img.get_rect(topleft=(self.mario_x, self.mario_y)) if self.mario_img else None
+        self.flap_requested = False
+        self.input = InputManager()
+        self.flap_stamps = [] # Press times of the flaps applied since the last present, for the latency stats
+        self.replay = None # Recording of the current run
+        self.replay_player = None # Set while watching a replay instead of playing
+        self.renderer = DirtyRectRenderer((WIDTH, HEIGHT)) if dirty_rects else None
+        self.profiler = FrameProfiler(); self.profile_export = PROFILER_EXPORT_FILE
+        self.capture = None # FrameCapture recording every displayed frame (--capture)
+        self.autopilot = None # Loaded on the first attract-mode demo (False = none available)
+        self.attract = False # True while the autopilot plays a demo run from START
+        self.idle_since = 0 # Ticks when START was last shown or touched
+        self.ghosts = None # GhostRace over the best stored runs, built on the first START that shows it (False = unavailable)
+        self.ghost_keys = None # (ended_at, seed) of the runs it holds, so unchanged leaderboards skip reloading
+        self.ghosts_in_run = False # Ghosts fly alongside the current run (GHOSTS_IN_PLAY)
+        self.quality = QualityGovernor(); self._apply_quality()
 
         self.high_score = load_high_score()
+        self.score_writer = HighScoreWriter()
+        self.run_stats = RunStatsStore() if persist else RunStatsStore(":memory:")
+        self.top_scores = tuple(r[0] for r in self.run_stats.top()) # Leaderboard shown on START / GAME_OVER
+        self.run_frame_ms = [] # Real frame times of the current run, for its stats row
         self.credits_scroll_pos = float(HEIGHT)
         self.credits_lines = credits_lines
 
         self.death_time = 0; self.show_flash = False; self.new_high_score_flag = False
+        self._startup_phase("game objects")
+
+    def set_quality(self, name):
+        """ Pin a quality tier by name (--quality), turning the governor off. """
+        if not self.quality.pin(name): print(f"Warning: Unknown quality tier {name!r}"); return
+        self._apply_quality()
+
+    def _apply_quality(self):
+        name, ghosts, depth_layers, parallax, pause_tint, flash = self.quality.tier
+        if self.ghosts: self.ghosts.set_shown(ghosts)
+        self.background_manager.depth_layers = depth_layers; self.background_manager.parallax = parallax
+        self.ui_manager.pause_tint = pause_tint; self.ui_manager.flash_mode = flash
+        self.profiler.quality = name; self.profiler.hud = None
+        if self.renderer: self.renderer.invalidate()
+
+    def _startup_phase(self, name):
+        """ Record the time since the previous startup phase ended. """
+        now = time.perf_counter(); self.startup_times[name] = (now - self.startup_mark) * 1000.0; self.startup_mark = now
+
+    def _report_startup(self):
+        total = sum(self.startup_times.values())
+        print("Startup: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in self.startup_times.items()) + f" -> first frame at {total:.1f} ms")
 
     def _load_assets(self):
-        # (Asset loading logic - unchanged)
         print("-" * 10 + " Loading Game Assets " + "-" * 10)
         assets = {'bird_images': [], 'pipe': None, 'background': None, 'ground': None, 'mario': None, 'font': None, 'big_font': None}
-        # ... [Rest of image loading logic] ...
-        downloads_folder = os.path.join(os.path.expanduser("~"), "Downloads")
-        print(f"Searching in: {downloads_folder}")
-        try:
-            bird_paths = [find_asset_path(f"bird_{n}", [".png"]) for n in ["down", "mid", "up"]]
-            pipe_path, bg_path = find_asset_path("pipe", [".png"]), find_asset_path("background", [".png"])
-            mario_path, ground_path = find_asset_path("mario", [".png"]), find_asset_path("ground", [".png"])
-            bird_frames_loaded = False
-            if all(bird_paths): assets['bird_images'] = [pygame.transform.scale(pygame.image.load(p).convert_alpha(), (BIRD_WIDTH, BIRD_HEIGHT)) for p in bird_paths]; bird_frames_loaded = True;
-            else: print(" - Bird anim frames missing.")
-            if pipe_path: assets['pipe'] = pygame.image.load(pipe_path).convert_alpha();
-            else: print(" - Pipe fail.")
-            if bg_path: assets['background'] = pygame.image.load(bg_path).convert();
-            else: print(" - Background fail.")
-            if ground_path: assets['ground'] = pygame.image.load(ground_path).convert_alpha();
-            else: print(" - Ground fail.")
-            if mario_path: assets['mario'] = pygame.transform.scale(pygame.image.load(mario_path).convert_alpha(), (MARIO_WIDTH, MARIO_HEIGHT));
-            else: print(" - Mario fail.")
-            if not (bird_frames_loaded and assets['pipe'] and assets['mario'] and assets['ground']): print("Using fallback for core missing images.")
-            elif not assets['background']: print(" - Using fallback background.")
-            else: print("Core images loaded.")
-        except Exception as e: print(f" Img Load Err: {e}. Using Fallbacks.")
+        # Packed bundle if present (sprites from one mmap, sounds handed to the audio loader), else loose files from Downloads
+        self.bundle_sounds = {}; self.bundle_mixer = None
+        bundle = load_asset_bundle(resource_path(ASSET_BUNDLE_FILE))
+        if bundle:
+            sprites, self.bundle_sounds, self.bundle_mixer = bundle
+            bird_frames = [sprites.get(f"bird_{n}") for n in ["down", "mid", "up"]]
+            if all(bird_frames): assets['bird_images'] = bird_frames
+            for key in ('pipe', 'background', 'ground', 'mario'): assets[key] = sprites.get(key)
+            print(f"Loaded {len(sprites)} sprites and {len(self.bundle_sounds)} sounds from asset bundle.")
+        else:
+            downloads_folder = os.path.join(os.path.expanduser("~"), "Downloads")
+            print(f"Searching in: {downloads_folder}")
+            try:
+                bird_paths = [find_asset_path(f"bird_{n}", [".png"]) for n in ["down", "mid", "up"]]
+                pipe_path, bg_path = find_asset_path("pipe", [".png"]), find_asset_path("background", [".png"])
+                ground_path = find_asset_path("ground", [".png"]) # Mario loads on first use (mario_img)
+                bird_frames_loaded = False
+                if all(bird_paths): assets['bird_images'] = [pygame.transform.scale(pygame.image.load(p).convert_alpha(), (BIRD_WIDTH, BIRD_HEIGHT)) for p in bird_paths]; bird_frames_loaded = True;
+                else: print(" - Bird anim frames missing.")
+                if pipe_path: assets['pipe'] = pygame.image.load(pipe_path).convert_alpha();
+                else: print(" - Pipe fail.")
+                if bg_path: assets['background'] = pygame.image.load(bg_path).convert();
+                else: print(" - Background fail.")
+                if ground_path: assets['ground'] = pygame.image.load(ground_path).convert_alpha();
+                else: print(" - Ground fail.")
+                if not (bird_frames_loaded and assets['pipe'] and assets['ground']): print("Using fallback for core missing images.")
+                elif not assets['background']: print(" - Using fallback background.")
+                else: print("Core images loaded.")
+            except Exception as e: print(f" Img Load Err: {e}. Using Fallbacks.")
         if not assets['bird_images']: bf = pygame.Surface((BIRD_WIDTH,BIRD_HEIGHT),pygame.SRCALPHA); bf.fill(GREEN); assets['bird_images']=[bf]*3; print(" Fallback bird.")
         if assets['pipe'] is None: assets['pipe'] = pygame.Surface((50, HEIGHT)); assets['pipe'].fill(DARK_GRAY); print(" Fallback pipe.")
         if assets['background'] is None: assets['background'] = pygame.Surface((WIDTH, HEIGHT)); assets['background'].fill(BLUE); print(" Fallback background.")
         if assets['ground'] is None: assets['ground'] = pygame.Surface((WIDTH,GROUND_HEIGHT)); assets['ground'].fill(GREEN); print(" Fallback ground.")
-        if assets['mario'] is None: assets['mario'] = pygame.Surface((MARIO_WIDTH,MARIO_HEIGHT),pygame.SRCALPHA); assets['mario'].fill(RED); print(" Fallback Mario.")
+        for name, *_ in PARALLAX_LAYERS: # Extra depth layers beyond background/ground
+            if name in assets: continue
+            layer_path = find_asset_path(name, [".png"])
+            try: assets[name] = pygame.image.load(layer_path).convert_alpha() if layer_path else None
+            except Exception as e: print(f" Layer Load Err ({name}): {e}."); assets[name] = None
+            if assets[name] is None: print(f" - Parallax layer '{name}' missing; skipped.")
         try: assets['font'] = pygame.font.Font(None, 36); assets['big_font'] = pygame.font.Font(None, 60); assert assets['font'] and assets['big_font']
         except Exception: print("Warn: Font load fail. Text disabled."); assets['font']=None; assets['big_font']=None
         print("-" * 38)
         return assets
 
-    def _load_audio(self):
-        # (Audio loading logic - unchanged)
-        global flap_sound, collision_sound, point_sound, bg_music_player, vlc_instance, bg_music_file_path, SOUND_ENABLED, MUSIC_ENABLED
-        if PYGAME_MIXER_OK:
+    @property
+    def mario_img(self):
+        """ Mario sprite, loaded on first use - he only appears at MARIO_TRIGGER_SCORE. """
+        if self.assets['mario'] is None:
+            mario_path = find_asset_path("mario", [".png"])
             try:
-                print("Loading SFX (Pygame - WAV)...")
-                fs_path, cs_path = find_asset_path("flap", [".wav"]), find_asset_path("collision", [".wav"])
-                pt_path = find_asset_path("point", [".wav"])
-                sfx_ok = True
-                if fs_path: flap_sound = pygame.mixer.Sound(fs_path)
-                else: print(" - flap.wav missing."); sfx_ok = False
-                if cs_path: collision_sound = pygame.mixer.Sound(cs_path)
-                else: print(" - collision.wav missing."); sfx_ok = False
-                if pt_path: point_sound = pygame.mixer.Sound(pt_path)
-                else: print(" - point.wav missing."); sfx_ok = False
-                SOUND_ENABLED = sfx_ok
-                if SOUND_ENABLED: print("SFX loaded.")
-                else: print("SFX disabled.")
-            except Exception as e: print(f" SFX Load Err: {e}. Disabled."); SOUND_ENABLED = False
-        else: print("SFX disabled."); SOUND_ENABLED = False
-        if VLC_AVAILABLE:
-            try:
-                print("Loading Music (VLC - WAV)...")
-                bg_music_path = find_asset_path("background_music", [".wav"])
-                bg_music_file_path = bg_music_path
-                if bg_music_path:
-                    if vlc is None: raise ImportError()
-                    vlc_instance = vlc.Instance('--no-xlib --quiet')
-                    if not vlc_instance: raise RuntimeError()
-                    bg_music_player = vlc_instance.media_player_new()
-                    if not bg_music_player: raise RuntimeError()
-
-                    def restart_music_callback(event):
-                        global vlc_instance, bg_music_player, bg_music_file_path, MUSIC_ENABLED
-                        if bg_music_player and vlc_instance and bg_music_file_path:
-                            try:
-                                media = vlc_instance.media_new(bg_music_file_path)
-                                if media: bg_music_player.set_media(media); media.release(); bg_music_player.play()
-                                else: MUSIC_ENABLED = False
-                            except Exception: MUSIC_ENABLED = False
-                        else: MUSIC_ENABLED = False
-
-                    ev_mgr = bg_music_player.event_manager()
-                    if ev_mgr:
-                        ev_mgr.event_attach(vlc.EventType.MediaPlayerEndReached, restart_music_callback)
-                        media = vlc_instance.media_new(bg_music_path)
-                        if media: bg_music_player.set_media(media); media.release(); print("Music loaded."); MUSIC_ENABLED = True
-                        else: print("Error: Music media create failed."); MUSIC_ENABLED = False
-                    else: print("Warn: VLC event manager failed."); MUSIC_ENABLED = False
-                else: print(" - background_music.wav missing."); MUSIC_ENABLED = False
-            except Exception as e:
-                print(f" Music Load Warn: Err:{e}. Disabled.")
-                if bg_music_player: bg_music_player.release(); bg_music_player = None
-                if vlc_instance: vlc_instance.release(); vlc_instance = None
-                MUSIC_ENABLED = False
-        else: print("Music disabled."); MUSIC_ENABLED = False
+                if mario_path: self.assets['mario'] = pygame.transform.scale(pygame.image.load(mario_path).convert_alpha(), (MARIO_WIDTH, MARIO_HEIGHT))
+                else: print(" - Mario fail.")
+            except Exception as e: print(f" Mario Load Err: {e}.")
+            if self.assets['mario'] is None: self.assets['mario'] = pygame.Surface((MARIO_WIDTH,MARIO_HEIGHT),pygame.SRCALPHA); self.assets['mario'].fill(RED); print(" Fallback Mario.")
+        return self.assets['mario']
+
+    def _start_audio_loading(self):
+        """ Load audio on a worker thread so the START screen never waits on the mixer. """
+        self.audio_thread = threading.Thread(target=self._load_audio, name="audio-loader", daemon=True)
+        self.audio_thread.start()
+
+    def _apply_audio_ready(self):
+        """ Main-thread follow-up once background audio is in: report it and start music a run is waiting on. """
+        self.audio_applied = True
+        print(f"Audio ready after {self.startup_times.get('audio (background)', 0.0):.1f} ms in the background.")
+        if self.game_state == PLAYING: self.play_bg_music()
+
+    def _load_audio(self):
+        audio_start = time.perf_counter()
+        self.audio.load(self.bundle_sounds, self.bundle_mixer)
+        self.bundle_sounds = {} # PCM now lives in the Sound objects
         print("-" * 38)
+        if BACKGROUND_AUDIO_LOADING: self.startup_times["audio (background)"] = (time.perf_counter() - audio_start) * 1000.0
+        self.audio_ready = True
+
+    @property
+    def score(self): return self.sim.score
+    @property
+    def mario_rect(self): return self.sim.mario_rect
 
     # --- Audio Playback Methods ---
-    def play_sfx(self, sound_obj): play_sound(sound_obj)
-    def play_bg_music(self): play_music()
-    def pause_bg_music(self): pause_music()
-    def resume_bg_music(self): resume_music()
+    def play_sfx(self, name): self.audio.play_sfx(name)
+    def play_bg_music(self): self.audio.play_music()
+    def pause_bg_music(self): self.audio.pause_music()
+    def resume_bg_music(self): self.audio.resume_music()
 
     # --- Game State Management ---
     def set_state(self, new_state):
         print(f"State: {self.game_state} -> {new_state}")
         self.game_state = new_state
+        self.flap_requested = False; self.input.clear_flaps()
+        if new_state in (START_SCREEN, GAME_OVER): self.top_scores = tuple(r[0] for r in self.run_stats.top())
+        if new_state == START_SCREEN:
+            self.idle_since = ticks_ms()
+            if GHOSTS_ON_START: self._load_ghosts()
         if new_state == CREDITS:
             self.credits_scroll_pos = float(HEIGHT)
 
@@ -673,23 +2162,98 @@ class Game:
         global high_score
         print("\n--- Resetting Game ---")
         self.new_high_score_flag = False
-        self.bird.reset()
-        self.pipe_manager.reset()
+        run_seed = self.tournament_seed if self.tournament_seed is not None else self.seed_rng.getrandbits(32)
+        print(f"Run seed: {run_seed}")
+        self.replay_player = None
+        self.sim.reset(run_seed)
+        self.replay = Replay.for_simulation(self.sim) if REPLAY_RECORDING and self.persist and not self.attract else None
+        self.run_frame_ms = []
+        self.background_manager.reset()
+        self.death_time = 0; self.show_flash = False
+        self.ghosts_in_run = GHOSTS_IN_PLAY and self._load_ghosts()
+        self.set_state(PLAYING)
+        if not self.attract: self.play_bg_music()
+
+    def _load_ghosts(self):
+        """ (Re)start the ghost race over the best stored runs; only decodes replays when those runs changed. True if any ghosts fly. """
+        if self.ghosts is False: return False
+        runs = self.run_stats.ghosts(GHOST_COUNT)
+        if self.ghosts is None:
+            if not runs: return False # Nothing to fly yet: don't build the race (or import NumPy) for it
+            try: self.ghosts = GhostRace(self.assets['bird_images']); self.ghosts.set_shown(self.quality.tier[1])
+            except ImportError as e: print(f"Ghosts disabled: {e}"); self.ghosts = False
+        if not self.ghosts: return False
+        keys = tuple((r[1], r[2]) for r in runs)
+        if keys != self.ghost_keys:
+            replays = []
+            for run in runs:
+                try: replays.append(Replay.from_bytes(run[3]))
+                except (ValueError, struct.error) as e: print(f"Warning: Skipping unreadable ghost replay: {e}")
+            self.ghosts.load(replays); self.ghost_keys = keys
+        else: self.ghosts.restart()
+        return self.ghosts.n > 0
+
+    def _ghosts_shown(self):
+        if not self.ghosts or self.replay_player: return False
+        return self.ghosts_in_run if self.game_state != START_SCREEN else GHOSTS_ON_START
+
+    def _start_attract(self):
+        """ Let the trained autopilot play a demo run; any key or click brings the title back. """
+        self.idle_since = ticks_ms() # Also spaces out retries when there is no autopilot
+        if self.autopilot is None: self.autopilot = Autopilot.load() or False
+        if not self.autopilot: return
+        self.attract = True
+        self.initialize_and_reset()
+
+    def _stop_attract(self):
+        self.attract = False; self.show_flash = False
+        self.audio.stop_music()
+        self.set_state(START_SCREEN)
+
+    def start_tournament(self, seed):
+        """ Tournament mode: every run plays the precomputed course for seed, the same on every machine. """
+        if not PipeCourse.valid_seed(seed): print(f"Warning: Tournament seed must be in 0..{2 ** 32 - 1}, got {seed}"); return False
+        self.tournament_seed = seed
+        self.pipe_manager.set_course(PipeCourse.load(seed, self.pipe_manager.pipe_width))
+        print(f"Tournament course {seed}")
+        return True
+
+    def start_replay(self, replay):
+        """ Watch a recorded run in the window. LEFT/RIGHT seek, SPACE at the end restarts it. """
+        if replay.pipe_width != self.pipe_manager.pipe_width: print("Warning: replay was recorded with a different pipe sprite; playback may diverge.")
+        self.sim.dt = replay.dt; self.sim.swept = replay.swept
+        if replay.pixel_collision != (self.sim.bird_masks is not None): self.sim.set_pixel_collision(replay.pixel_collision, self.assets['pipe'])
+        self.pipe_manager.set_course(PipeCourse.load(replay.seed, replay.pipe_width) if replay.course else None)
+        self.replay = None
+        self.replay_player = ReplayPlayer(replay, self.sim)
+        self.new_high_score_flag = False
         self.background_manager.reset()
-        self.score = 0
-        self.mario_y = -MARIO_HEIGHT
-        if self.mario_rect: self.mario_rect.topleft = (self.mario_x, self.mario_y)
         self.death_time = 0; self.show_flash = False
         self.set_state(PLAYING)
-        self.play_bg_music()
+
+    def _seek_replay(self, frame):
+        self.replay_player.seek(frame)
+        self.show_flash = False
+        if self.game_state != self.sim.state: self.set_state(self.sim.state)
+
+    def _finish_replay(self):
+        if not self.replay: return
+        self.replay.finish(self.sim.frame, self.score)
+        self.score_writer.submit_replay(get_data_filepath(REPLAY_FILE), self.replay.to_bytes(), len(self.replay.flaps)) # Written off the death frame
+        self.replay = None
 
     # --- Core Game Loop Methods ---
     def handle_events(self):
-        clicked = False; mouse_pos = pygame.mouse.get_pos(); current_time = pygame.time.get_ticks()
-        for event in pygame.event.get():
+        clicked = False; mouse_pos = pygame.mouse.get_pos(); current_time = ticks_ms()
+        for stamp, event in self.input.drain():
             if event.type == pygame.QUIT: self.running = False
+            if self.attract and (event.type == pygame.KEYDOWN or event.type == pygame.MOUSEBUTTONDOWN):
+                self._stop_attract(); continue # Input only ends the demo
+            if self.game_state == START_SCREEN and event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN): self.idle_since = ticks_ms()
+            if event.type == pygame.VIDEOEXPOSE and self.renderer: self.renderer.invalidate()
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: clicked = True
             if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3: self.profiler.toggle_hud()
                 if event.key == pygame.K_ESCAPE:
                     if self.game_state == CREDITS: self.running = False
                     elif self.game_state == PLAYING: self.set_state(PAUSED); self.pause_bg_music()
@@ -697,147 +2261,511 @@ class Game:
                 elif self.game_state == START_SCREEN and event.key == pygame.K_SPACE:
                     self.initialize_and_reset()
                 elif self.game_state == PLAYING:
-                    if event.key == pygame.K_SPACE: self.bird.flap(); self.play_sfx(flap_sound)
+                    if event.key == pygame.K_SPACE and not self.replay_player: self.input.queue_flap(stamp) # Applied by run() at its sim step
                     elif event.key == pygame.K_p: self.set_state(PAUSED); self.pause_bg_music()
                 elif self.game_state == PAUSED and event.key == pygame.K_p: self.set_state(PLAYING); self.resume_bg_music()
                 elif self.game_state == GAME_OVER and event.key == pygame.K_SPACE:
-                    if current_time - self.death_time > RESTART_DELAY: self.initialize_and_reset()
+                    if current_time - self.death_time > RESTART_DELAY:
+                        if self.replay_player: self._seek_replay(0)
+                        else: self.initialize_and_reset()
+                if self.replay_player and event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    offset = REPLAY_SEEK_FRAMES if event.key == pygame.K_RIGHT else -REPLAY_SEEK_FRAMES
+                    self._seek_replay(self.sim.frame + offset)
         if self.game_state == PAUSED and clicked and self.ui_manager.resume_button_rect:
              if self.ui_manager.resume_button_rect.collidepoint(mouse_pos): self.set_state(PLAYING); self.resume_bg_music()
 
     def update(self):
-        global high_score
-
-        if self.game_state == PLAYING:
-            self.bird.update()
-            score_increase = self.pipe_manager.update(self.bird.rect)
-            self.score += score_increase
-            self.background_manager.update(self.pipe_manager.current_speed)
-
-            pipe_rects = self.pipe_manager.get_collision_rects()
-            if check_collision(self.bird.rect, pipe_rects, self.pipe_manager.pipe_width): # Pass width
-                self.play_sfx(collision_sound)
-                self.new_high_score_flag = (self.score > high_score)
-                if self.new_high_score_flag: high_score = self.score; save_high_score(high_score)
-                self.death_time = pygame.time.get_ticks()
-                self.show_flash = True
-                self.set_state(GAME_OVER)
-                if MUSIC_ENABLED and bg_music_player: bg_music_player.stop()
-
-            if self.score >= MARIO_TRIGGER_SCORE:
-                 print("MARIO TIME!")
-                 self.new_high_score_flag = (self.score > high_score)
-                 if self.new_high_score_flag: high_score = self.score; save_high_score(high_score)
-                 self.set_state(MARIO_EVENT)
-                 self.mario_y = -MARIO_HEIGHT
-                 self.mario_x = self.bird.rect.centerx - MARIO_WIDTH // 2 if self.bird.rect else WIDTH // 2 - MARIO_WIDTH // 2
-                 if self.mario_rect: self.mario_rect.topleft = (self.mario_x, self.mario_y)
-                 if MUSIC_ENABLED and bg_music_player: bg_music_player.stop()
-
-        elif self.game_state == MARIO_EVENT:
-            if self.mario_rect:
-                self.mario_y += MARIO_FALL_SPEED
-                self.mario_rect.topleft = (self.mario_x, self.mario_y)
-                if self.bird.rect and check_mario_collision(self.bird.rect, self.mario_rect):
-                    print("Mario caught the bird!")
-                    self.new_high_score_flag = (self.score > high_score)
-                    if self.new_high_score_flag: high_score = self.score; save_high_score(high_score)
-                    self.set_state(CREDITS)
+        if self.attract:
+            if self.game_state == PLAYING: self.flap_requested = self.autopilot.decide(self.sim)
+            elif self.game_state != MARIO_EVENT and ticks_ms() - self.death_time > ATTRACT_RESTART_MS: self._stop_attract()
+        elif self.game_state == START_SCREEN and not self.replay_player and ticks_ms() - self.idle_since > ATTRACT_DELAY_MS:
+            self._start_attract()
+        if self.game_state in [PLAYING, MARIO_EVENT]:
+            was_playing = self.game_state == PLAYING
+            if self.replay_player: events = self.replay_player.step()
+            else: events = self.sim.step(self.flap_requested)
+            self.flap_requested = False
+            if self.ghosts_in_run and not self.replay_player: self.ghosts.step()
+            if was_playing: self.background_manager.update(self.pipe_manager.current_speed)
+            else: self.background_manager.hold()
+            self._handle_sim_events(events)
 
         elif self.game_state in [START_SCREEN, PAUSED, GAME_OVER]:
-             speed = self.pipe_manager.current_speed if self.game_state != START_SCREEN else BASE_PIPE_SPEED
-             self.background_manager.update(speed)
+             if self.game_state == START_SCREEN and GHOSTS_ON_START:
+                 if self.ghosts:
+                     self.ghosts.step()
+                     if self.ghosts.frame > self.ghosts.last_frame + GHOST_RESTART_FRAMES: self.ghosts.restart()
+             if self.renderer: self.background_manager.hold() # Keep static screens static so they cost no redraws
+             else:
+                 speed = self.pipe_manager.current_speed if self.game_state != START_SCREEN else BASE_PIPE_SPEED
+                 self.background_manager.update(speed)
 
         elif self.game_state == CREDITS:
             self.credits_scroll_pos -= CREDITS_SCROLL_SPEED
 
-    def draw(self):
-        self.background_manager.draw(self.screen)
-        if self.game_state == START_SCREEN:
-            self.ui_manager.draw_start_screen(self.screen, high_score)
-        elif self.game_state == PLAYING:
-            self.pipe_manager.draw(self.screen)
-            self.bird.draw(self.screen)
-            self.ui_manager.draw_playing_ui(self.screen, self.score, high_score)
-        elif self.game_state == PAUSED:
-            self.pipe_manager.draw(self.screen)
-            self.bird.draw(self.screen)
+    def _handle_sim_events(self, events):
+        for event in events:
+            if event == SIM_FLAP:
+                self.play_sfx("flap")
+                if self.replay: self.replay.record_flap(self.sim.frame - 1)
+            elif event == SIM_POINT: self.play_sfx("point")
+            elif event == SIM_COLLISION:
+                self.play_sfx("collision")
+                self._record_high_score()
+                self._record_run("ground" if self.bird.rect.bottom >= HEIGHT - GROUND_HEIGHT else "pipe")
+                self._finish_replay()
+                self.death_time = ticks_ms()
+                self.show_flash = True
+                self.set_state(GAME_OVER)
+                self.audio.stop_music()
+            elif event == SIM_MARIO:
+                print("MARIO TIME!")
+                self._record_high_score()
+                self.set_state(MARIO_EVENT)
+                self.audio.stop_music()
+            elif event == SIM_CAUGHT:
+                print("Mario caught the bird!")
+                self._record_high_score()
+                self._record_run("mario")
+                self._finish_replay()
+                self.set_state(CREDITS)
+
+    def _record_run(self, cause):
+        """ Queue this run's row for the stats store; the timing stats are computed on the writer thread. """
+        if self.replay_player or self.attract or not self.persist: return # Replays and demos aren't new runs
+        if self.replay: self.replay.finish(self.sim.frame, self.score) # Kept in the row too: the ghost races fly it
+        self.run_stats.record(ended_at=time.time(), score=self.score, duration=self.sim.frame / TARGET_FPS, frames=self.sim.frame,
+                              seed=self.sim.seed, cause=cause, max_speed=self.pipe_manager.current_speed, # Speed only rises during a run
+                              replay=self.replay.to_bytes() if self.replay else None, frame_ms=self.run_frame_ms)
+        self.run_frame_ms = []
+
+    def _record_high_score(self):
+        global high_score
+        if self.replay_player or self.attract or not self.persist: return # Watching a replay or demo doesn't earn anything
+        self.new_high_score_flag = (self.score > high_score)
+        if self.new_high_score_flag: high_score = self.score; self.score_writer.submit(high_score)
+
+    def draw(self, alpha=1.0):
+        """ alpha: fraction of a sim step elapsed since the last update(), used to interpolate motion. """
+        if not self.renderer:
+            self._draw_layers(alpha)
+            self.profiler.draw_hud(self.screen)
+            t = time.perf_counter(); pygame.display.flip(); self.profiler.lap('present', t)
+            return
+        self._mark_dirty_layers(alpha)
+        rects = self.renderer.finish()
+        if not rects: return # Nothing on screen changed
+        self.screen.set_clip(rects[0].unionall(rects[1:]))
+        self._draw_layers(alpha)
+        self.profiler.draw_hud(self.screen)
+        self.screen.set_clip(None)
+        t = time.perf_counter(); pygame.display.update(rects); self.profiler.lap('present', t)
+
+    def _mark_dirty_layers(self, alpha):
+        screen_rect = self.renderer.screen_rect; mark = self.renderer.mark; state = self.game_state
+        if state == CREDITS:
+            mark('credits', round(self.credits_scroll_pos + CREDITS_SCROLL_SPEED * (1.0 - alpha)), [screen_rect])
+            return
+        for layer, offset in self.background_manager.draw_positions(alpha): mark(layer.name, offset, [layer.rect])
+        if state != START_SCREEN:
+            motion_alpha = alpha if state == PLAYING else 1.0
+            pipe_rects = self.pipe_manager.draw_rects(motion_alpha)
+            mark('pipes', tuple(tuple(r) for r in pipe_rects), pipe_rects)
+        if self._ghosts_shown():
+            ghost_alpha = alpha if state in (START_SCREEN, PLAYING) else 1.0
+            ghost_rect = self.ghosts.bounds(ghost_alpha)
+            if ghost_rect: mark('ghosts', (self.ghosts.frame, ghost_alpha), [ghost_rect])
+        if state != START_SCREEN:
+            bird_surf, bird_rect = self.bird.get_rotated(motion_alpha)
+            mark('bird', (id(bird_surf), tuple(bird_rect)), [bird_rect])
+        if state == MARIO_EVENT and self.mario_rect:
+            mario_rect = self.mario_rect.move(0, -round(MARIO_FALL_SPEED * (1.0 - alpha)))
+            mark('mario', tuple(mario_rect), [mario_rect])
+        if state in [PLAYING, MARIO_EVENT]: mark('ui', (state, self.score, high_score), [pygame.Rect(0, 0, WIDTH, HUD_HEIGHT)])
+        else: mark('ui', (state, self.score, high_score, self.new_high_score_flag, self.top_scores), [screen_rect])
+        if state == GAME_OVER:
+            mark('flash', (self.show_flash and ticks_ms() - self.death_time < FLASH_DURATION, self.ui_manager.flash_mode), [screen_rect])
+        if self.attract: mark('attract', True, [self.ui_manager.attract_banner()[1] or screen_rect])
+        if self.profiler.show_hud:
+            hud_rect = self.profiler.hud_surface()[1]
+            mark('profiler', self.profiler.hud_version, [hud_rect])
+
+    def _draw_layers(self, alpha):
+        # Each layer's time is charged to its profiler section; Mario and overlays count as UI
+        prof = self.profiler; state = self.game_state; t = time.perf_counter()
+        if state == CREDITS:
+            self.ui_manager.draw_credits(self.screen, self.credits_scroll_pos + CREDITS_SCROLL_SPEED * (1.0 - alpha), self.credits_lines)
+            prof.lap('ui', t)
+            return
+        self.background_manager.draw(self.screen, alpha); t = prof.lap('background', t)
+        if state != START_SCREEN:
+            motion_alpha = alpha if state == PLAYING else 1.0 # Frozen screens draw the last sim step as-is
+            self.pipe_manager.draw(self.screen, motion_alpha); t = prof.lap('pipes', t)
+        if self._ghosts_shown(): # Above the pipes, under the player's bird
+            self.ghosts.draw(self.screen, alpha if state in (START_SCREEN, PLAYING) else 1.0); t = prof.lap('ghosts', t)
+        if state != START_SCREEN:
+            self.bird.draw(self.screen, motion_alpha); t = prof.lap('bird', t)
+        if state == START_SCREEN:
+            self.ui_manager.draw_start_screen(self.screen, high_score, self.top_scores)
+        elif state in (PLAYING, PAUSED, MARIO_EVENT):
+            if state == MARIO_EVENT and self.mario_rect and self.mario_img: self.screen.blit(self.mario_img, self.mario_rect.move(0, -round(MARIO_FALL_SPEED * (1.0 - alpha))))
             self.ui_manager.draw_playing_ui(self.screen, self.score, high_score)
-            resume_btn_rect = self.ui_manager.draw_pause_overlay(self.screen) # Store returned rect if needed elsewhere
-        elif self.game_state == GAME_OVER:
-             self.pipe_manager.draw(self.screen)
-             self.bird.draw(self.screen)
-             self.ui_manager.draw_game_over_screen(self.screen, self.score, high_score, self.new_high_score_flag)
-             current_time = pygame.time.get_ticks()
-             if self.show_flash and current_time - self.death_time < FLASH_DURATION: self.ui_manager.draw_flash(self.screen)
-             elif self.show_flash: self.show_flash = False
-        elif self.game_state == MARIO_EVENT:
-             self.pipe_manager.draw(self.screen)
-             self.bird.draw(self.screen)
-             if self.mario_rect and self.mario_img: self.screen.blit(self.mario_img, self.mario_rect)
-             self.ui_manager.draw_playing_ui(self.screen, self.score, high_score)
-        elif self.game_state == CREDITS:
-            self.ui_manager.draw_credits(self.screen, self.credits_scroll_pos, self.credits_lines)
-        pygame.display.flip()
+            if state == PAUSED: self.ui_manager.draw_pause_overlay(self.screen)
+        elif state == GAME_OVER:
+            self.ui_manager.draw_game_over_screen(self.screen, self.score, high_score, self.new_high_score_flag, self.top_scores)
+            current_time = ticks_ms()
+            if self.show_flash and current_time - self.death_time < FLASH_DURATION: self.ui_manager.draw_flash(self.screen)
+            elif self.show_flash: self.show_flash = False
+        if self.attract: self.ui_manager.draw_attract_banner(self.screen)
+        prof.lap('ui', t)
 
     def run(self):
         global high_score
         print("\n--- Starting Game Loop ---")
         high_score = load_high_score()
 
+        # Fixed-timestep loop: the sim always advances in SIM_DT steps, several per frame if rendering
+        # falls behind, and draw() interpolates the leftover fraction so motion stays smooth.
+        accumulator = 0.0; previous = time.perf_counter(); first_frame = True
         while self.running:
+            now = time.perf_counter(); frame_s = now - previous
+            accumulator += min(frame_s, MAX_FRAME_TIME); previous = now
+            if not first_frame: self.profiler.end_frame(frame_s * 1000.0) # Closes the previous frame, tick wait included
+            if self.game_state == PLAYING: self.run_frame_ms.append(frame_s * 1000.0)
             self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(TARGET_FPS)
+            t = self.profiler.lap('events', now)
+            # Step k brings the sim up to real time now - accumulator + (k+1)*SIM_DT; a flap is applied on the first
+            # step whose slice ends after its press, and the last step of the frame takes any that are still waiting.
+            # Only player flaps are queued (not replay or demo input), so only they feed the latency stats.
+            steps = min(int(accumulator // SIM_DT), MAX_SIM_STEPS_PER_FRAME); step_end = now - accumulator
+            for k in range(steps):
+                step_end += SIM_DT
+                due = self.input.take_flaps(step_end if k < steps - 1 else float('inf'))
+                if due: self.flap_requested = True; self.flap_stamps += due
+                self.update(); accumulator -= SIM_DT
+            self.profiler.lap('update', t)
+            if steps == MAX_SIM_STEPS_PER_FRAME: accumulator = min(accumulator, SIM_DT) # Drop backlog we can't catch up on
+            self.draw(accumulator / SIM_DT)
+            if self.flap_stamps: # draw() has presented, so this is press -> on screen
+                presented = time.perf_counter()
+                for stamp in self.flap_stamps: self.profiler.record_latency((presented - stamp) * 1000.0)
+                self.flap_stamps.clear()
+            if self.capture: t = time.perf_counter(); self.capture.grab(self.screen); self.profiler.lap('capture', t)
+            if first_frame:
+                first_frame = False; self._startup_phase("first frame"); self._report_startup()
+                if BACKGROUND_AUDIO_LOADING: self._start_audio_loading()
+                if GHOSTS_ON_START and self.game_state == START_SCREEN: self._load_ghosts() # The first START is entered without set_state
+            elif self.audio_ready and not self.audio_applied: self._apply_audio_ready()
+            # Only the animated screens are judged; static ones would let the governor raise quality for free
+            if self.game_state in (START_SCREEN, PLAYING) and self.quality.observe((time.perf_counter() - now) * 1000.0): self._apply_quality()
+            if INPUT_POLL_MS > 0: self.input.wait_until(now + 1.0 / TARGET_FPS) # Keeps stamping input while we wait
+            else: self.clock.tick(TARGET_FPS)
         self.shutdown()
 
     def shutdown(self):
         print("Exiting game...")
+        if self.audio_thread: self.audio_thread.join(2.0) # Don't tear the mixer down under a half-finished load
+        self.audio.shutdown()
+        self.score_writer.close() # Flushes a high score still queued from the last run
+        self.run_stats.close()
+        if self.profile_export: self.profiler.export(self.profile_export)
+        if self.profiler.latency:
+            p50, p99, mx = self.profiler.stats()["input"]
+            print(f"Input latency (press -> present, last {len(self.profiler.latency)} flaps): p50 {p50:.1f} ms, p99 {p99:.1f} ms, max {mx:.1f} ms")
+        print(self.quality.report())
+        if self.capture: self.capture.close()
         pygame.quit()
-        global vlc_instance, bg_music_player
-        if vlc_instance:
-            print("Releasing VLC resources...")
-            if bg_music_player: bg_music_player.release()
-            vlc_instance.release()
         print("Cleanup complete. Goodbye!")
         sys.exit()
 
-# --- Audio Helper Functions (Remain Global) ---
-# (Keep these defined globally)
-def play_sound(sound_obj):
-    global SOUND_ENABLED
-    if SOUND_ENABLED and sound_obj:
-        try: sound_obj.play()
-        except Exception as e: print(f"SFX Play Error: {e}"); SOUND_ENABLED = False
-def play_music():
-    global MUSIC_ENABLED, vlc_instance, bg_music_player, bg_music_file_path
-    if MUSIC_ENABLED and bg_music_player and vlc_instance and bg_music_file_path:
-        try:
-            state = bg_music_player.get_state()
-            if state not in [vlc.State.Playing, vlc.State.Paused]:
-                 media = vlc_instance.media_new(bg_music_file_path)
-                 if media: bg_music_player.set_media(media); media.release(); bg_music_player.play()
-                 else: MUSIC_ENABLED = False
-        except Exception as e: print(f"Music Play Error: {e}"); MUSIC_ENABLED = False
-def pause_music():
-    if MUSIC_ENABLED and bg_music_player and bg_music_player.is_playing():
-        try: bg_music_player.pause()
-        except Exception: pass
-def resume_music():
-     global MUSIC_ENABLED
-     if MUSIC_ENABLED and bg_music_player:
+# --- RL Environment (Gym-style) ---
+class FlappyEnv:
+    """ reset()/step(action) wrapper around a headless Game, shaped like the Gymnasium API:
+        reset() -> (obs, info) and step(action) -> (obs, reward, terminated, truncated, info); action 1 = flap, 0 = glide.
+        obs_type "state": STATE_SIZE floats per frame - bird rect and velocity, the next ENV_NEXT_PIPES gaps, current_speed.
+        obs_type "pixels": the screen downscaled to pixel_size (height, width), read zero-copy via surfarray.pixels3d.
+        Each step runs frame_skip sim frames; the last frame_stack observations come back stacked on a new first axis.
+        The Game only supplies sprites and drawing: steps drive its Simulation directly, so there are no sounds,
+        saves, state logs or frame clock, and an episode runs as fast as the CPU allows.
+        Envs in one process share pygame's single display surface; step them one at a time.
+    """
+    ACTIONS = 2
+    STATE_SIZE = 6 + 3 * ENV_NEXT_PIPES
+    GRAY_WEIGHTS = (77, 150, 29) # ITU-R 601 luma in 1/256ths
+
+    def __init__(self, obs_type="state", frame_skip=ENV_FRAME_SKIP, frame_stack=ENV_FRAME_STACK, pixel_size=ENV_PIXEL_SIZE,
+                 grayscale=True, max_frames=ENV_MAX_FRAMES, seed=None, headless=True):
+        if obs_type not in ("state", "pixels"): raise ValueError(f"obs_type must be 'state' or 'pixels', not {obs_type!r}")
+        need_numpy("FlappyEnv")
+        if frame_skip < 1 or frame_stack < 1: raise ValueError("frame_skip and frame_stack must be at least 1")
+        if headless: os.environ.setdefault("SDL_VIDEODRIVER", "dummy"); os.environ.setdefault("SDL_AUDIODRIVER", "dummy") # Before the display starts
+        self.obs_type = obs_type; self.frame_skip = frame_skip; self.frame_stack = frame_stack
+        self.grayscale = grayscale; self.max_frames = max_frames
+        self.game = Game(seed=seed, dirty_rects=False, persist=False)
+        self.sim = self.game.sim
+        self.frames = deque(maxlen=frame_stack)
+        height, width = pixel_size
+        # Nearest-neighbour sample points; pixels3d is indexed [x, y], so these broadcast to a (width, height) gather
+        self.sample_x = np.linspace(0, WIDTH - 1, width).round().astype(np.intp)[:, None]
+        self.sample_y = np.linspace(0, HEIGHT - 1, height).round().astype(np.intp)[None, :]
+        self.gray_weights = np.array(self.GRAY_WEIGHTS, dtype=np.uint16)
+        if obs_type == "state": self.observation_shape = (frame_stack, self.STATE_SIZE)
+        else: self.observation_shape = (frame_stack, height, width) if grayscale else (frame_stack, height, width, 3)
+
+    def reset(self, seed=None):
+        """ Start a new episode (seed=None: the next seed from the env's own seed sequence). Returns (obs, info). """
+        game = self.game
+        self.sim.reset(seed if seed is not None else game.seed_rng.getrandbits(32))
+        game.replay_player = None; game.background_manager.reset()
+        game.game_state = PLAYING # Always drawn as a run in progress; the episode's end is read from sim.state
+        obs = self._observe()
+        self.frames.clear(); self.frames.extend([obs] * self.frame_stack)
+        return np.stack(self.frames), self._info()
+
+    def step(self, action):
+        """ Apply action, run frame_skip frames (fewer if the run ends). Returns (obs, reward, terminated, truncated, info). """
+        sim = self.sim; background = self.game.background_manager; reward = 0.0
+        for i in range(self.frame_skip):
+            events = sim.step(bool(action) and i == 0)
+            background.update(sim.pipe_manager.current_speed)
+            if SIM_POINT in events: reward += ENV_REWARD_POINT
+            if SIM_COLLISION in events: reward += ENV_REWARD_DEATH
+            else: reward += ENV_REWARD_ALIVE
+            if sim.state != PLAYING: break # Crashed, or reached Mario (the end of the playable run)
+        terminated = sim.state != PLAYING
+        truncated = not terminated and sim.frame >= self.max_frames
+        self.frames.append(self._observe())
+        return np.stack(self.frames), reward, terminated, truncated, self._info()
+
+    def _info(self):
+        return {"score": self.sim.score, "frame": self.sim.frame, "seed": self.sim.seed, "state": self.sim.state}
+
+    def _observe(self):
+        return self._state_vector() if self.obs_type == "state" else self._pixels()
+
+    def _state_vector(self):
+        """ Positions and sizes as fractions of the screen; velocity and speed in px/frame. Missing pipes read as far off. """
+        bird = self.sim.bird; rect = bird.rect; pm = self.sim.pipe_manager
+        obs = [rect.x / WIDTH, rect.y / HEIGHT, rect.width / WIDTH, rect.height / HEIGHT, bird.velocity]
+        ring = pm.ring; cap = len(ring); found = 0
+        for i in range(pm.count):
+            p = ring[(pm.head + i) % cap]
+            if p.upper.right <= rect.left: continue # Already behind the bird
+            obs += [(p.upper.x - rect.right) / WIDTH, p.upper.bottom / HEIGHT, p.lower.top / HEIGHT]; found += 1
+            if found == ENV_NEXT_PIPES: break
+        for _ in range(found, ENV_NEXT_PIPES): obs += [1.0, (HEIGHT - GROUND_HEIGHT - PIPE_GAP_BASE) / 2 / HEIGHT, (HEIGHT - GROUND_HEIGHT + PIPE_GAP_BASE) / 2 / HEIGHT]
+        obs.append(pm.current_speed)
+        return np.array(obs, dtype=np.float32)
+
+    def _pixels(self):
+        """ Draw the frame into the screen surface (no flip), then sample it in place. """
+        screen = self.game.screen
+        self.game._draw_layers(1.0)
+        view = pygame.surfarray.pixels3d(screen) # (WIDTH, HEIGHT, 3) view of the surface's own memory
+        small = view[self.sample_x, self.sample_y] # The only copy: one gather of the output pixels
+        del view # Unlock the screen before anything blits to it again
+        small = small.transpose(1, 0, 2) # -> (height, width, 3)
+        if not self.grayscale: return np.ascontiguousarray(small)
+        return ((small @ self.gray_weights) >> 8).astype(np.uint8) # uint16 dot: 255 * 256 can't overflow
+
+    def render(self):
+        """ Show the current frame in the window (headless=False). """
+        self.game._draw_layers(1.0); pygame.display.flip(); pygame.event.pump()
+
+    def close(self):
+        self.game.score_writer.close(); self.game.run_stats.close()
+        pygame.quit()
+
+
+# --- Benchmarks ---
+def autopilot_flap(sim):
+    """ Scripted input: flap while the bird is below the next gap's centre and not already rising fast. """
+    bird = sim.bird; target = HEIGHT // 2
+    for p in sim.pipe_manager.pipes:
+        if p.upper.right > bird.rect.left: target = (p.upper.bottom + p.lower.top) // 2 + 10; break
+    return bird.rect.centery > target and bird.velocity > -2
+
+def _bench_ops(game):
+    """ Benchmark name -> zero-argument callable, all driving one headless Game. """
+    screen = game.screen; bird = game.bird; pipes = game.pipe_manager; ui = game.ui_manager; background = game.background_manager
+    top = (120, 98, 75); credits_pos = [float(HEIGHT)]
+    def bird_update():
+        if bird.rect.centery > HEIGHT // 2 and bird.velocity > 0: bird.flap()
+        bird.update()
+    def credits():
+        credits_pos[0] = credits_pos[0] - 1 if credits_pos[0] > -400 else float(HEIGHT)
+        ui.draw_credits(screen, credits_pos[0], game.credits_lines)
+    def game_frame():
+        if game.game_state != PLAYING: game.initialize_and_reset()
+        game.flap_requested = autopilot_flap(game.sim)
+        game.update(); game.draw(0.5)
+    try: ghosts = GhostRace(game.assets['bird_images'])
+    except ImportError: ghosts = None
+    if ghosts: # GHOST_COUNT synthetic runs: a flap every 18-30 frames keeps them airborne, like real ones
+        rng = random.Random(BENCH_SEED); replays = []
+        for i in range(GHOST_COUNT):
+            replay = Replay(i); frame = rng.randint(0, 30)
+            while frame < 3000: replay.record_flap(frame); frame += rng.randint(18, 30)
+            replay.finish(3000, 0); replays.append(replay)
+        ghosts.load(replays)
+        for _ in range(200): ghosts.step()
+    def ghosts_step():
+        if ghosts.finished: ghosts.restart()
+        ghosts.step()
+    game.initialize_and_reset()
+    ops = OrderedDict([
+        ("bird.update", bird_update),
+        ("bird.get_rotated", lambda: bird.get_rotated(0.5)),
+        ("pipes.update", lambda: pipes.update(bird.rect)),
+        ("pipes.draw", lambda: pipes.draw(screen, 0.5)),
+        ("check_collision", lambda: check_collision(bird.rect, pipes.get_collision_rects(), pipes.pipe_width)),
+        ("check_swept_collision", lambda: check_swept_collision(bird.rect, bird.prev_y, pipes)),
+        ("background.draw", lambda: background.draw(screen, 0.5)),
+        ("ui.draw_start_screen", lambda: ui.draw_start_screen(screen, 120, top)),
+        ("ui.draw_playing_ui", lambda: ui.draw_playing_ui(screen, 42, 120)),
+        ("ui.draw_pause_overlay", lambda: ui.draw_pause_overlay(screen)),
+        ("ui.draw_game_over_screen", lambda: ui.draw_game_over_screen(screen, 42, 120, False, top)),
+        ("ui.draw_credits", credits),
+        ("ui.draw_attract_banner", lambda: ui.draw_attract_banner(screen)),
+        ("ui.draw_flash", lambda: ui.draw_flash(screen)),
+        ("game.frame", game_frame), # Game.update + Game.draw (flip included), autopilot input, restarts on death
+    ])
+    if ghosts:
+        ops["ghosts.step"] = ghosts_step
+        ops["ghosts.draw"] = lambda: ghosts.draw(screen, 0.5)
+    return ops
+
+def _bench_calibrate(fn):
+    """ Calls per round for one op: double them until a round is long enough to time. """
+    fn(); calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls): fn()
+        if time.perf_counter() - start >= BENCH_MIN_ROUND_S: return calls
+        calls *= 2
+
+def _bench_measure(ops):
+    """ Name -> result dict for each op in ops. The rounds are interleaved (one round of every op, BENCH_ROUNDS
+        times) so machine drift over the run lands on all ops alike instead of on whichever ran last.
+        spread is the interquartile range of an op's rounds relative to its median. """
+    import gc, tracemalloc
+    calls = OrderedDict((name, _bench_calibrate(fn)) for name, fn in ops.items())
+    rounds = {name: [] for name in ops}
+    for _ in range(BENCH_ROUNDS):
+        for name, fn in ops.items():
+            n = calls[name]; start = time.perf_counter()
+            for _ in range(n): fn()
+            rounds[name].append((time.perf_counter() - start) / n)
+    results = OrderedDict()
+    for name, fn in ops.items():
+        times = sorted(rounds[name]); n = len(times); median = times[n // 2]
+        spread = (times[(3 * n) // 4] - times[n // 4]) / median if median else 0.0
+        # Allocations on a separate, shorter pass - tracemalloc would skew the timings
+        alloc_calls = min(calls[name], 1000); gc.collect(); tracemalloc.start(); blocks = sys.getallocatedblocks()
+        for _ in range(alloc_calls): fn()
+        blocks = sys.getallocatedblocks() - blocks; peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+        results[name] = {"us_median": round(median * 1e6, 3), "us_best": round(times[0] * 1e6, 3), "spread": round(spread, 4),
+                         "calls_per_round": calls[name], "net_blocks_per_call": round(blocks / alloc_calls, 3),
+                         "traced_peak_kb": round(peak / 1024.0, 1)}
+    return results
+
+def _bench_threshold(result, base):
+    """ Slowdown ratio above which result counts as a regression against base: BENCH_TOLERANCE, widened for ops
+        whose rounds scatter (baselines from before the spread was recorded count as steady). """
+    return max(BENCH_TOLERANCE, BENCH_SPREAD_FACTOR * max(result["spread"], base.get("spread", 0.0)))
+
+def _bench_speed(results, baseline):
+    """ Median slowdown of all ops shared with baseline: how much slower the machine as a whole runs than when the
+        baseline was taken (load, clocks, another VM). An op is judged against this rather than against 1. """
+    ratios = sorted(r["us_median"] / baseline[name]["us_median"] for name, r in results.items()
+                    if baseline.get(name, {}).get("us_median"))
+    return ratios[len(ratios) // 2] if len(ratios) >= 3 else 1.0
+
+def _bench_regressed(result, base, speed):
+    expected = base["us_median"] * speed
+    return result["us_median"] > expected * (1.0 + _bench_threshold(result, base)) and result["us_median"] - expected > BENCH_NOISE_FLOOR_US
+
+def _bench_flagged(results, baseline, speed):
+    return {name for name, r in results.items() if baseline.get(name, {}).get("us_median") and _bench_regressed(r, baseline[name], speed)}
+
+def run_benchmarks(baseline_path=None, out_path=None):
+    """ Time every op in _bench_ops, write the results as JSON and compare them with a baseline
+        (an earlier results file) by median, net of the machine's overall speed. Returns False if any op regressed past its threshold on two runs in a row. """
+    out_path = out_path or get_data_filepath(BENCH_OUTPUT_FILE)
+    game = Game(seed=BENCH_SEED, persist=False)
+    ops = _bench_ops(game); results = _bench_measure(ops)
+    report = {"seed": BENCH_SEED, "rounds": BENCH_ROUNDS, "python": sys.version.split()[0], "pygame": pygame.version.ver,
+              "video_driver": pygame.display.get_driver(), "ops": results}
+    baseline = None
+    if baseline_path:
         try:
-            if bg_music_player.get_state() == vlc.State.Paused: bg_music_player.pause()
-            elif bg_music_player.get_state() != vlc.State.Playing: play_music()
-        except Exception: MUSIC_ENABLED = False
+            with open(baseline_path, 'r') as f: baseline = json.load(f)["ops"]
+        except Exception as e: print(f"Warning: Could not read benchmark baseline {baseline_path}: {e}")
+    regressions = []; speed = 1.0
+    if baseline:
+        speed = _bench_speed(results, baseline); flagged = _bench_flagged(results, baseline, speed)
+        if flagged: # One slow pass is often a scheduler hiccup; a real regression repeats, so time everything again
+            print(f"Over the limit: {', '.join(sorted(flagged))} - re-running to confirm")
+            results = report["ops"] = _bench_measure(ops); speed = _bench_speed(results, baseline)
+            regressions = [name for name in results if name in flagged & _bench_flagged(results, baseline, speed)]
+    print(f"{'op':<26}{'median us':>11}{'best us':>10}{'spread':>8}{'blocks':>9}{'peak KB':>9}" + (f"   vs baseline (limit), machine {speed - 1.0:+.1%}" if baseline else ""))
+    for name, r in results.items():
+        base = baseline.get(name) if baseline else None
+        line = f"{name:<26}{r['us_median']:>11.2f}{r['us_best']:>10.2f}{r['spread']:>8.1%}{r['net_blocks_per_call']:>9.2f}{r['traced_peak_kb']:>9.1f}"
+        if base and base.get("us_median"):
+            line += f"   {r['us_median'] / (base['us_median'] * speed) - 1.0:+7.1%} ({_bench_threshold(r, base):.0%})"
+            if name in regressions: line += "  REGRESSION"
+        print(line)
+    report["regressions"] = regressions
+    try:
+        with open(out_path, 'w') as f: json.dump(report, f, indent=1)
+        print(f"Benchmark results written: {out_path}")
+    except Exception as e: print(f"Warning: Could not write benchmark results to {out_path}: {e}")
+    if regressions: print(f"{len(regressions)} op(s) regressed past their limit on two runs: {', '.join(regressions)}")
+    game.run_stats.close()
+    return not regressions
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    if pygame.get_init() and pygame.display.get_init():
-        game = Game()
-        globals()['game'] = game # Make game instance globally accessible if needed
-        game.run()
-    else:
-        print("Fatal Error: Pygame display not initialized before creating Game object.")
-        sys.exit()
\ No newline at end of file
+    if getattr(sys, 'frozen', False): import multiprocessing; multiprocessing.freeze_support() # Pool workers in a frozen exe
+    import argparse
+    parser = argparse.ArgumentParser(description="Flappy Bird OOP")
+    parser.add_argument("--replay", metavar="FILE", help="watch a recorded run (.flr)")
+    parser.add_argument("--headless", action="store_true", help="with --replay: re-simulate at full speed without a window and verify the score (with --capture: render it)")
+    parser.add_argument("--profile", metavar="FILE", help="write per-frame section timings to FILE (.csv or .json) on exit")
+    parser.add_argument("--capture", metavar="OUT", help="record the frames to OUT: .gif, a video file (ffmpeg), .rgb raw, or a PNG directory")
+    parser.add_argument("--render-top", metavar="N", type=int, help="with --capture: render the N best stored runs headless (OUT gets _1.._N)")
+    parser.add_argument("--bench", action="store_true", help=f"run the hot-path benchmarks headless and write {BENCH_OUTPUT_FILE}")
+    parser.add_argument("--bench-baseline", metavar="FILE", help="with --bench: compare with an earlier results file, exit 1 on regressions")
+    parser.add_argument("--train-autopilot", metavar="GENERATIONS", type=int, help=f"evolve the attract-mode autopilot and checkpoint it to {AUTOPILOT_FILE}")
+    parser.add_argument("--workers", type=int, help="with --train-autopilot: worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, help="with --train-autopilot: seed for a reproducible training run")
+    parser.add_argument("--quality", metavar="TIER", choices=[t[0] for t in QUALITY_TIERS], help="pin a quality tier instead of adapting to the frame rate")
+    parser.add_argument("--tournament", metavar="SEED", type=int, help="play the fixed pipe course for SEED on every run (cached under courses/)")
+    parser.add_argument("--build-bundle", metavar="OUT", nargs="?", const="", default=None, help=f"pack the loose assets into {ASSET_BUNDLE_FILE} (or OUT) and exit")
+    args = parser.parse_args()
+    if args.tournament is not None and not PipeCourse.valid_seed(args.tournament): parser.error(f"--tournament SEED must be in 0..{2 ** 32 - 1}")
+    if args.train_autopilot:
+        train_autopilot(args.train_autopilot, args.workers, args.seed)
+        sys.exit(0)
+    if args.bench:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy"); os.environ.setdefault("SDL_AUDIODRIVER", "dummy") # Headless, before the display starts
+        sys.exit(0 if run_benchmarks(args.bench_baseline) else 1)
+    if args.build_bundle is not None:
+        sys.exit(0 if build_asset_bundle(args.build_bundle or None) else 1)
+    if args.render_top:
+        if not args.capture: parser.error("--render-top needs --capture OUT")
+        sys.exit(0 if render_top_runs(args.render_top, args.capture) else 1)
+    if args.replay and args.headless:
+        if args.capture: sys.exit(0 if render_replay(Replay.load(args.replay), args.capture) else 1)
+        sys.exit(0 if verify_replay(args.replay) else 1)
+    game = Game() # Exits itself if pygame or the display can't start
+    globals()['game'] = game # Make game instance globally accessible if needed
+    if args.profile: game.profile_export = args.profile
+    if args.tournament is not None: game.start_tournament(args.tournament)
+    if args.quality: game.set_quality(args.quality)
+    if args.capture:
+        try: game.capture = FrameCapture(args.capture)
+        except ImportError as e: print(f"Capture disabled: {e}")
+    if args.replay: game.start_replay(Replay.load(args.replay))
+    game.run()
\ No newline at end of file